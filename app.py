@@ -1,13 +1,23 @@
 import streamlit as st
 import streamlit.components.v1 as components
 import pandas as pd
-import math
-import random
 from datetime import datetime, timedelta
-from urllib.parse import quote
 import pycountry
 import textwrap
 
+from cards import render_cards
+from country_index import CountryIndex
+from distance import load_travel_matrices
+from instrumentation import METRICS_PORT, start_metrics_server, start_run, stage
+from ranking import CITY_SORT_KEYS, COUNTRY_SORT_KEYS, SORT_LABELS, top_k_rows
+from result_cache import ResultCache, cached_search
+from spatial import SpatialIndex
+from trip_engine import (
+    ACCOM_TIERS, ACTIVITY_TIERS, FLIGHT_CLASS_TIERS, MODE_FIND, MODE_MAXIMIZE, MODE_PRICE, MOCK_ACTIVITIES_LIST,
+    BudgetIndex, OriginCache, PairTables, RowIndex, enrich_data, travel_style_for
+)
+from data_prep import fare_index_for, load_master, master_data_version
+
 # Set page config
 st.set_page_config(page_title="WanderWise", layout="wide")
 
@@ -138,6 +148,16 @@ st.markdown("""
         margin-bottom: 12px;
     }
     
+    .card-flag {
+        border-radius: 4px;
+        vertical-align: middle;
+        margin-right: 8px;
+    }
+    
+    .card-activities {
+        margin: 12px 0;
+    }
+    
     .activity-badge {
         background-color: #444;
         color: #fff;
@@ -235,6 +255,9 @@ st.markdown("""
         padding-top: 12px;
         margin-top: 10px;
     }
+    .breakdown p {
+        margin: 5px 0;
+    }
     
     .booking-button {
         display: inline-block;
@@ -312,87 +335,8 @@ REGION_FLIGHT_COSTS = {
     "North America": 400
 }
 
-ACCOM_TIERS = {
-    "Bare Essential (1 Star/Camping)": 0.5,
-    "Economy (2-4 Star Hotel)": 1.0,
-    "Luxury (5 Star Only)": 4.0
-}
-
-ACTIVITY_TIERS = {
-    "Budget (Street Food / Free Activities)": 0.5,
-    "Standard (Restaurants / Museums)": 1.0,
-    "Extra Spend (Fine Dining / Guided Tours)": 2.0
-}
-
-FLIGHT_CLASS_TIERS = {
-    "Bare Essential (Spirit/Ryanair / Basic Economy)": 1.0,
-    "Standard (Main Cabin / Checked Bag)": 1.5,
-    "Luxury (First Class / Business)": 3.5
-}
-
-MOCK_ACTIVITIES_LIST = ['Beach', 'Hiking', 'Caves', 'Skiing', 'History', 'Nightlife', 'Foodie', 'Nature', 'Adventure']
 MOCK_WEATHER = ["☀️ Sunny", "❄️ Snowy", "🌧️ Rainy", "🌤️ Temperate"]
 
-ACTIVITY_EMOJIS = {
-    'Beach': '🏖️',
-    'Hiking': '🥾',
-    'Caves': '🕳️',
-    'Skiing': '⛷️',
-    'History': '🏛️',
-    'Nightlife': '🌃',
-    'Foodie': '🍽️',
-    'Nature': '🌲',
-    'Adventure': '🏔️'
-}
-
-# V11.0: Country Name Cleanup Map
-COUNTRY_CLEANUP_MAP = {
-    "Korea, Republic of": "South Korea",
-    "Korea, Democratic People's Republic of": "North Korea",
-    "Russian Federation": "Russia",
-    "Iran, Islamic Republic of": "Iran",
-    "Tanzania, United Republic of": "Tanzania",
-    "Venezuela, Bolivarian Republic of": "Venezuela",
-    "Bolivia, Plurinational State of": "Bolivia",
-    "Moldova, Republic of": "Moldova",
-    "Syrian Arab Republic": "Syria",
-    "Taiwan, Province of China": "Taiwan",
-    "Lao People's Democratic Republic": "Laos",
-    "Congo, The Democratic Republic of the": "DR Congo",
-    "United States of America": "United States",
-    "United Kingdom of Great Britain and Northern Ireland": "United Kingdom",
-    "Palestine, State of": "Palestine"
-}
-
-def calculate_transport_cost(destination_name):
-    """Calculate daily transportation cost based on destination type"""
-    dest_str = str(destination_name) if pd.notna(destination_name) else "Unknown"
-    dest_lower = dest_str.lower()
-    
-    mega_cities = ['london', 'tokyo', 'new york', 'paris', 'berlin', 'singapore', 
-                   'hong kong', 'barcelona', 'amsterdam', 'seoul', 'taipei', 'chicago',
-                   'boston', 'washington', 'san francisco', 'toronto', 'montreal']
-    
-    sprawl_cities = ['los angeles', 'houston', 'miami', 'dubai', 'atlanta',
-                     'dallas', 'phoenix', 'san diego', 'las vegas', 'orlando']
-    
-    nature_rural = ['reykjavik', 'iceland', 'yellowstone', 'banff', 'queenstown',
-                    'patagonia', 'safari', 'fjord', 'highlands', 'anchorage']
-    
-    for city in mega_cities:
-        if city in dest_lower:
-            return 10.0
-    
-    for city in sprawl_cities:
-        if city in dest_lower:
-            return 50.0
-    
-    for location in nature_rural:
-        if location in dest_lower:
-            return 80.0
-    
-    return 30.0
-
 def get_country_name(iso_code):
     """Helper to get full country name from ISO code for search routing"""
     try:
@@ -427,123 +371,88 @@ def make_bold(text):
     trans = str.maketrans(normal, bold)
     return str(text).translate(trans)
 
-def get_flag_emoji(country_code):
-    """V11.0: Helper to convert ISO country code to SVG Flag URL"""
-    if not country_code or len(country_code) != 2:
-        return ""
-    # Returns an HTML img tag for the flag
-    return f"<img src='https://flagcdn.com/48x36/{country_code.lower()}.png' style='border-radius: 4px; vertical-align: middle; margin-right: 8px;' width='32'>"
-
-# V11.0: Country Desirability Scores (1-10) for Best Value Calculation
-COUNTRY_DESIRABILITY = {
-    # High Demand / Iconic
-    "France": 10, "Italy": 10, "Japan": 10, "Spain": 9, "Greece": 9, 
-    "United States": 8, "United Kingdom": 8, "Thailand": 9, "Indonesia": 9,
-    "Portugal": 9, "Vietnam": 8, "Mexico": 8, "Australia": 8, "Canada": 8,
-    
-    # Rising Popularity
-    "Turkey": 7, "Croatia": 8, "Iceland": 8, "Switzerland": 8,
-    "Morocco": 7, "Egypt": 7, "Peru": 7, "Brazil": 7, "South Africa": 7,
-    "Argentina": 7, "Colombia": 7, "Costa Rica": 7, "Philippines": 7,
-    
-    # Standard Tourist
-    "Germany": 7, "Netherlands": 7, "Sweden": 6, "Norway": 6, "Finland": 6,
-    "Denmark": 6, "Austria": 6, "Belgium": 6, "Ireland": 6, "Czech Republic": 6,
-    "Hungary": 6, "Poland": 6, "India": 6, "China": 6, "South Korea": 7,
-    "Malaysia": 7, "Singapore": 7, "Maldives": 8, "New Zealand": 8,
-    
-    # Default fallback will be 5
-}
+@st.cache_resource
+def load_real_data(v="csv"):
+    """Load pre-processed master travel dataset (V12.0: typed Parquet artifact, CSV fallback)
 
-def calculate_haversine(lat1, lon1, lat2, lon2):
-    """V7.1: Great-circle distance between two points in km"""
-    if any(pd.isna([lat1, lon1, lat2, lon2])): return 0
-    R = 6371  # Earth radius in km
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = (math.sin(dlat / 2)**2 + 
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * 
-         math.sin(dlon / 2)**2)
-    c = 2 * math.asin(math.sqrt(a))
-    return R * c
-
-def get_booking_url(search_term, level, checkin_date):
-    """V10.0: Precision Hotel Routing using Booking.com filters (nflt)"""
-    base_url = f"https://www.booking.com/searchresults.html?ss={quote(search_term)}&checkin={checkin_date}"
-    
-    if "Luxury" in level:
-        # V10.2: 5-star only
-        return f"{base_url}&nflt=class%3D5"
-    elif "Economy" in level:
-        # V10.2: 4-star, 3-star, 2-star
-        return f"{base_url}&nflt=class%3D4%3Bclass%3D3%3Bclass%3D2"
-    else:
-        # V10.0: Bare Essentials: 2-star, 1-star
-        return f"{base_url}&nflt=class%3D2%3Bclass%3D1"
-
-@st.cache_data
-def load_real_data(v="V9.0"):
-    """Load pre-processed master travel dataset (V6.0 Build-Time Shift)"""
+    V12.0: Enriched once per process and shared by every session without a per-rerun copy.
+    The returned frame is read-only by convention; per-request columns live in trip_engine arrays.
+    """
     try:
-        df = pd.read_csv("master_travel_data.csv")
-        
-        # 1. Clean Country Names
-        if 'Full_Country' in df.columns:
-            df['Full_Country'] = df['Full_Country'].replace(COUNTRY_CLEANUP_MAP)
-            
-        # 2. Deduplicate City Cards
-        # Strategy: Keep the entry with Lowest Base Flight Cost, then Highest Popularity Score
-        # This ensures we pick main airports (e.g., CDG over LBG for Paris) which fixes broken links
-        if 'Base_Flight_Cost' in df.columns and 'Popularity_Score' in df.columns:
-            df = df.sort_values(
-                by=['Destination', 'Base_Flight_Cost', 'Popularity_Score'], 
-                ascending=[True, True, False]
-            )
-        
-        # Drop duplicates on 'Destination' keeping the first (Best Match)
-        df = df.drop_duplicates(subset=['Destination'], keep='first')
-        
-        return df
+        return enrich_data(load_master(v))
     except Exception as e:
         st.error(f"Error loading master dataset: {e}")
         return pd.DataFrame()
 
-def enrich_data(df):
-    """Add lightweight mock enrichment (activities, transport)"""
-    def get_activities(name):
-        name_str = str(name) if pd.notna(name) else "Unknown"
-        random.seed(hash(name_str) % 10000)
-        k = random.randint(2, 4)
-        return random.sample(MOCK_ACTIVITIES_LIST, min(k, len(MOCK_ACTIVITIES_LIST)))
-
-    df['Activities'] = df['Destination'].apply(get_activities)
-    df['Transport_Cost_Daily'] = df['Destination'].apply(calculate_transport_cost)
-    
-    # V11.0: Calculate Best Value Score
-    # Formula: (Perceived Value Score * 1000) / Total Daily Cost (Proxy for Trip Cost)
-    # We use Total_Daily_Group as a proxy before duration is set, re-calc later with flight
-    def get_desirability(country_name):
-        return COUNTRY_DESIRABILITY.get(country_name, 5) # Default 5
-        
-    if 'Full_Country' in df.columns:
-        df['Perceived_Value'] = df['Full_Country'].apply(get_desirability)
-    else:
-        df['Perceived_Value'] = 5
-        
-    return df
-
-# Load Real Data
-with st.spinner("🚀 Booting WanderWise Data Engine..."):
-    destinations_df = load_real_data()
-
-if destinations_df.empty:
-    st.error("Failed to load WanderWise data. Did you run data_prep.py?")
-    st.stop()
+@st.cache_resource
+def load_matrices():
+    """V12.0: Shared mmap handle on the build-time distance/flight matrices (None if not built)"""
+    return load_travel_matrices()
+
+@st.cache_resource
+def load_fares(v):
+    """V12.0: DOT airport-pair fare lookup, compiled from the bundled CSV if data_prep.py hasn't written it"""
+    return fare_index_for(load_real_data(v)['IATA'])
+
+@st.cache_resource
+def load_spatial_index(v):
+    """V12.0: KD-tree over destination coordinates, built once per dataset version"""
+    return SpatialIndex.from_frame(load_real_data(v))
+
+@st.cache_resource
+def load_budget_index(v):
+    """V12.0: Destinations sorted by daily cost per tier, for budget pruning"""
+    return BudgetIndex(load_real_data(v))
+
+@st.cache_resource
+def load_row_index(v):
+    """V12.0: Destination / IATA -> row position hash maps"""
+    return RowIndex(load_real_data(v))
+
+@st.cache_resource
+def load_pair_tables(v):
+    """V12.0: Matrix / fare table positions per destination row, for single-pair lookups"""
+    return PairTables(load_real_data(v), load_matrices(), load_fares(v))
+
+@st.cache_resource
+def load_country_index(v):
+    """V12.0: Country ids per destination row, for the country grid aggregates"""
+    return CountryIndex(load_real_data(v))
+
+ORIGIN_CACHE_SIZE = 256
+
+@st.cache_resource
+def load_origin_cache(v):
+    """V12.0: Process-wide LRU of origin distance vectors, one per dataset version"""
+    return OriginCache(maxsize=ORIGIN_CACHE_SIZE)
+
+@st.cache_resource
+def load_result_cache(v):
+    """V12.0: Process-wide cache of compact search results, shared by every session"""
+    return ResultCache()
+
+@st.cache_resource
+def load_metrics_server():
+    """V12.0: Serve /metrics from this process when WANDERWISE_METRICS_PORT is set (once per process)"""
+    return start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+
+# V12.0: Stage timings for this rerun (a no-op unless WANDERWISE_METRICS / WANDERWISE_PROFILE is set).
+# The page runs inside try/finally so st.rerun(), st.stop() and errors still close the run.
+load_metrics_server()
+run = start_run("app")
+try:
+    # Load Real Data
+    with st.spinner("🚀 Booting WanderWise Data Engine..."), stage("load_real_data") as timer:
+        data_version = master_data_version()
+        destinations_df = load_real_data(data_version)
+        timer.rows = len(destinations_df)
 
-destinations_df = enrich_data(destinations_df)
+    if destinations_df.empty:
+        st.error("Failed to load WanderWise data. Did you run data_prep.py?")
+        st.stop()
 
-# Title Redesign
-st.markdown("""
+    # Title Redesign
+    st.markdown("""
     <div style='text-align: center; padding-bottom: 20px;'>
         <h1 style='font-size: 72px; margin-bottom: 10px; background: linear-gradient(to right, #00D4BD, #2E86DE); -webkit-background-clip: text; -webkit-text-fill-color: transparent; display: inline-block; line-height: 1.1;'>
             Discover where your budget can take you.
@@ -554,178 +463,129 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
-# --- Session State Initialization ---
-if 'selected_country' not in st.session_state:
-    st.session_state.selected_country = None
-
-if 'sort_selection' not in st.session_state:
-    st.session_state.sort_selection = "Best Value ⭐"
-
-# --- Sidebar Navigation ---
-st.sidebar.header("✈️ Trip Settings")
-
-# V11.1: Sort Origin Cities by Popularity (High to Low) for better UX
-# We create a mapping of destination to popularity
-dest_popularity = destinations_df.set_index('Destination')['Popularity_Score'].to_dict()
-all_usable_airports = sorted(
-    [str(d) for d in destinations_df['Destination'].unique() if pd.notna(d)],
-    key=lambda x: dest_popularity.get(x, 0),
-    reverse=True
-)
+    # --- Session State Initialization ---
+    if 'selected_country' not in st.session_state:
+        st.session_state.selected_country = None
 
-try:
-    default_origin_idx = next(i for i, x in enumerate(all_usable_airports) if "New York" in x)
-except StopIteration:
-    default_origin_idx = 0
+    if 'sort_selection' not in st.session_state:
+        st.session_state.sort_selection = "value"
 
-try:
-    default_dest_idx = next((i for i, x in enumerate(all_usable_airports) if x.startswith("London, GB") or x == "London, United Kingdom"), 0)
-except StopIteration:
-    default_dest_idx = 0
-
-# --- Primary Inputs (Always Visible) ---
-origin_city = st.sidebar.selectbox("✈️ Origin City", options=all_usable_airports, index=default_origin_idx)
-
-# Simplified Budget Input (Integer Only)
-total_budget = st.sidebar.number_input(
-    "💰 Total Group Budget ($)",
-    min_value=500,
-    max_value=50000,
-    value=3000,
-    step=100,
-    format="%d"
-)
+    # --- Sidebar Navigation ---
+    st.sidebar.header("✈️ Trip Settings")
 
-num_travelers = st.sidebar.number_input("👥 Number of Travelers", min_value=1, max_value=10, value=1)
-duration = st.sidebar.slider("📅 Trip Duration (Days)", min_value=3, max_value=30, value=7)
+    # V11.1: Sort Origin Cities by Popularity (High to Low) for better UX
+    # We create a mapping of destination to popularity
+    dest_popularity = destinations_df.set_index('Destination')['Popularity_Score'].to_dict()
+    all_usable_airports = sorted(
+        [str(d) for d in destinations_df['Destination'].unique() if pd.notna(d)],
+        key=lambda x: dest_popularity.get(x, 0),
+        reverse=True
+    )
 
-st.sidebar.divider()
+    try:
+        default_origin_idx = next(i for i, x in enumerate(all_usable_airports) if "New York" in x)
+    except StopIteration:
+        default_origin_idx = 0
 
-# --- Advanced Filters & Style ---
-with st.sidebar.expander("🛠️ Advanced Filters & Style", expanded=False):
-    st.markdown("**🎯 Trip Goal**")
-    mode_options = ["Find Destinations 🌍", "Maximize Days 📅", "Price a Trip 💰"]
-    selected_mode = st.radio("Goal", mode_options, label_visibility="collapsed")
-    
-    # Initialize variables that depend on mode to defaults
-    target_dest = None
-    selected_regions = []
-    selected_activities = []
-    
-    if selected_mode == "Find Destinations 🌍":
-        st.markdown("**🔍 Filters**")
-        selected_regions = st.multiselect("🌎 Regions", options=sorted(destinations_df['Region'].unique()), default=[], placeholder="Select a Region (Optional)")
-        selected_activities = st.multiselect("🎯 Activities", options=MOCK_ACTIVITIES_LIST, default=[], placeholder="Select Activities (Optional)")
-        
-    elif selected_mode == "Maximize Days 📅":
-        target_dest = st.selectbox("🎯 Select Destination", options=all_usable_airports, index=default_dest_idx)
-    else: # Price a Trip
-        target_dest = st.selectbox("🎯 Select Destination", options=all_usable_airports, index=default_dest_idx)
+    try:
+        default_dest_idx = next((i for i, x in enumerate(all_usable_airports) if x.startswith("London, GB") or x == "London, United Kingdom"), 0)
+    except StopIteration:
+        default_dest_idx = 0
+
+    # --- Primary Inputs (Always Visible) ---
+    origin_city = st.sidebar.selectbox("✈️ Origin City", options=all_usable_airports, index=default_origin_idx)
+
+    # Simplified Budget Input (Integer Only)
+    total_budget = st.sidebar.number_input(
+        "💰 Total Group Budget ($)",
+        min_value=500,
+        max_value=50000,
+        value=3000,
+        step=100,
+        format="%d"
+    )
+
+    num_travelers = st.sidebar.number_input("👥 Number of Travelers", min_value=1, max_value=10, value=1)
+    duration = st.sidebar.slider("📅 Trip Duration (Days)", min_value=3, max_value=30, value=7)
+
+    st.sidebar.divider()
+
+    # --- Advanced Filters & Style ---
+    with st.sidebar.expander("🛠️ Advanced Filters & Style", expanded=False):
+        st.markdown("**🎯 Trip Goal**")
+        mode_options = ["Find Destinations 🌍", "Maximize Days 📅", "Price a Trip 💰"]
+        selected_mode = st.radio("Goal", mode_options, label_visibility="collapsed")
+
+        # Initialize variables that depend on mode to defaults
+        target_dest = None
+        selected_regions = []
+        selected_activities = []
+
+        if selected_mode == "Find Destinations 🌍":
+            st.markdown("**🔍 Filters**")
+            selected_regions = st.multiselect("🌎 Regions", options=sorted(destinations_df['Region'].unique()), default=[], placeholder="Select a Region (Optional)")
+            selected_activities = st.multiselect("🎯 Activities", options=MOCK_ACTIVITIES_LIST, default=[], placeholder="Select Activities (Optional)")
+
+        elif selected_mode == "Maximize Days 📅":
+            target_dest = st.selectbox("🎯 Select Destination", options=all_usable_airports, index=default_dest_idx)
+        else: # Price a Trip
+            target_dest = st.selectbox("🎯 Select Destination", options=all_usable_airports, index=default_dest_idx)
+
+        st.markdown("---")
+        st.markdown("**💸 Travel Style**")
+
+        st.markdown("**✈️ Flight Class**")
+        flight_class_name = st.selectbox("Choose flight class", options=list(FLIGHT_CLASS_TIERS.keys()), index=1, label_visibility="collapsed")
+
+        st.markdown("**🏨 Accommodation Level**")
+        accom_tier_name = st.selectbox("Choose accommodation style", options=list(ACCOM_TIERS.keys()), index=1, label_visibility="collapsed")
+
+        st.markdown("**🍽️ Food & Activities**")
+        act_tier_name = st.selectbox("Choose spending style", options=list(ACTIVITY_TIERS.keys()), index=1, label_visibility="collapsed")
+
+    # State Management for Mode
+    if 'last_mode' not in st.session_state:
+        st.session_state.last_mode = selected_mode
+    if st.session_state.last_mode != selected_mode:
+        st.session_state.selected_country = None
+        st.session_state.last_mode = selected_mode
+
+    # --- Cost Logic (V7.1 Distance-Aware) ---
+    # V12.0: All costing lives in trip_engine; this script only maps widgets to engine inputs
+    MODE_BY_LABEL = {"Find Destinations 🌍": MODE_FIND, "Maximize Days 📅": MODE_MAXIMIZE, "Price a Trip 💰": MODE_PRICE}
+
+    CITY_PAGE_SIZE = 30
+    travel_style = travel_style_for(flight_class_name, accom_tier_name, act_tier_name)
+    with stage("search") as timer:
+        search = cached_search(
+            load_result_cache(data_version), data_version,
+            destinations_df, MODE_BY_LABEL[selected_mode], origin_city, total_budget, num_travelers, duration,
+            style=travel_style, target_dest=target_dest, regions=selected_regions, activities=selected_activities,
+            matrices=load_matrices(), cache=load_origin_cache(data_version), fares=load_fares(data_version),
+            spatial=load_spatial_index(data_version), budget_index=load_budget_index(data_version),
+            pairs=load_pair_tables(data_version), rows=load_row_index(data_version)
+        )
+        timer.rows = len(search.result_df)
+    run.annotate(mode=MODE_BY_LABEL[selected_mode], origin=origin_city, results=len(search.result_df))
+    origin_iata = search.origin_iata
+    country_index = load_country_index(data_version)
+    result_df = search.result_df
 
     st.markdown("---")
-    st.markdown("**💸 Travel Style**")
-    
-    st.markdown("**✈️ Flight Class**")
-    flight_class_name = st.selectbox("Choose flight class", options=list(FLIGHT_CLASS_TIERS.keys()), index=1, label_visibility="collapsed")
-    flight_mult = FLIGHT_CLASS_TIERS[flight_class_name]
-    
-    st.markdown("**🏨 Accommodation Level**")
-    accom_tier_name = st.selectbox("Choose accommodation style", options=list(ACCOM_TIERS.keys()), index=1, label_visibility="collapsed")
-    accom_mult = ACCOM_TIERS[accom_tier_name]
-    
-    st.markdown("**🍽️ Food & Activities**")
-    act_tier_name = st.selectbox("Choose spending style", options=list(ACTIVITY_TIERS.keys()), index=1, label_visibility="collapsed")
-    act_mult = ACTIVITY_TIERS[act_tier_name]
-
-# State Management for Mode
-if 'last_mode' not in st.session_state:
-    st.session_state.last_mode = selected_mode
-if st.session_state.last_mode != selected_mode:
-    st.session_state.selected_country = None
-    st.session_state.last_mode = selected_mode
-
-# --- Cost Logic (V7.1 Distance-Aware) ---
-origin_row = destinations_df[destinations_df['Destination'] == origin_city]
-if not origin_row.empty:
-    o_lat = origin_row['latitude_deg'].values[0]
-    o_lon = origin_row['longitude_deg'].values[0]
-    origin_iata = origin_row['IATA'].values[0]
-else:
-    o_lat, o_lon, origin_iata = 0, 0, "AUS" # Default AUS if lookup fails
-
-# Map selected tier to pre-calculated Base Daily Cost
-if "Luxury" in accom_tier_name:
-    daily_base = destinations_df['Daily_Cost_Luxury']
-else:
-    daily_base = destinations_df['Daily_Cost_Budget']
-
-# Haversine Distance & Variable Flight Pricing
-destinations_df['Distance_KM'] = destinations_df.apply(
-    lambda r: calculate_haversine(o_lat, o_lon, r['latitude_deg'], r['longitude_deg']), axis=1
-)
-
-# Variable flight cost: $150 base + $0.08 per km
-# Ensures longer flights are more expensive while keeping local flights cheap
-destinations_df['Calculated_Flight_Base'] = 150 + (destinations_df['Distance_KM'] * 0.08)
-
-# Apply multipliers
-destinations_df['Daily_Hotel_Group'] = (daily_base * 0.4) * accom_mult * math.ceil(num_travelers / 2)
-destinations_df['Daily_Food_Group'] = (daily_base * 0.4) * num_travelers * act_mult
-destinations_df['Daily_Transport_Group'] = destinations_df['Transport_Cost_Daily'] * num_travelers
-
-destinations_df['Total_Daily_Group'] = destinations_df['Daily_Food_Group'] + destinations_df['Daily_Hotel_Group'] + destinations_df['Daily_Transport_Group']
-destinations_df['Total_Flight_Group'] = destinations_df['Calculated_Flight_Base'] * flight_mult * num_travelers
 
-st.markdown("---")
+    # --- Logic Engine ---
+    metric_display = None
 
-# --- Logic Engine ---
-result_df = pd.DataFrame()
-metric_display = None
-
-if selected_mode == "Find Destinations 🌍":
-    destinations_df['Trip_Cost'] = destinations_df['Total_Flight_Group'] + (destinations_df['Total_Daily_Group'] * duration)
-    result_df = destinations_df[destinations_df['Trip_Cost'] <= total_budget].copy()
-    
-elif selected_mode == "Maximize Days 📅":
-    row = destinations_df[destinations_df['Destination'] == target_dest]
-    if not row.empty:
-        flight_cost = row['Total_Flight_Group'].values[0]
-        daily_cost = row['Total_Daily_Group'].values[0]
-        remaining_budget = total_budget - flight_cost
-        max_days = math.floor(remaining_budget / daily_cost) if remaining_budget > 0 else 0
-        metric_display = ("You can stay for", f"{max_days} Days")
-        result_df = row.copy()
-        result_df['Trip_Cost'] = flight_cost + (daily_cost * max_days)
-    else:
-        st.error("Destination not found.")
-
-else:  # Price a Trip
-    row = destinations_df[destinations_df['Destination'] == target_dest]
-    if not row.empty:
-        flight_cost = row['Total_Flight_Group'].values[0]
-        daily_cost = row['Total_Daily_Group'].values[0]
-        trip_cost = flight_cost + (daily_cost * duration)
-        metric_display = ("Total Cost for Your Dream Trip", f"${trip_cost:,.0f}")
-        result_df = row.copy()
-        result_df['Trip_Cost'] = trip_cost
-    else:
+    if not search.target_found:
         st.error("Destination not found.")
+    elif selected_mode == "Maximize Days 📅":
+        metric_display = ("You can stay for", f"{search.max_days} Days")
+    elif selected_mode == "Price a Trip 💰":
+        metric_display = ("Total Cost for Your Dream Trip", f"${search.trip_cost:,.0f}")
 
-if not result_df.empty:
-    if selected_regions: result_df = result_df[result_df['Region'].isin(selected_regions)]
-    if selected_activities:
-        def has_activity(activity_list): return not set(selected_activities).isdisjoint(activity_list)
-        result_df = result_df[result_df['Activities'].apply(has_activity)]
-
-    # 3. Filter out Origin City from Destinations
-    # Ensure case-insensitive comparison
-    if origin_city:
-        origin_clean = str(origin_city).strip().lower()
-        result_df = result_df[~result_df['Destination'].astype(str).str.lower().eq(origin_clean)]
-
-# --- Display Results ---
-if metric_display and not result_df.empty:
-    st.markdown(f"""
+    # --- Display Results ---
+    if metric_display and not result_df.empty:
+        st.markdown(f"""
     <div class='hero-banner' style='background: linear-gradient(135deg, #00D4BD 0%, #2E86DE 100%); 
                 padding: 30px; border-radius: 15px; text-align: center; margin-bottom: 30px; box-shadow: 0 4px 15px rgba(0,0,0,0.3);'>
         <h2 style='margin: 0; font-size: 1.2em;'>{metric_display[0]}</h2>
@@ -734,230 +594,136 @@ if metric_display and not result_df.empty:
     </div>
     """, unsafe_allow_html=True)
 
-if not result_df.empty:
-    # Get current Month for weather lookup
-    travel_dt = datetime.now() + timedelta(days=60)
-    month_col = travel_dt.strftime("%b") # e.g., "Mar"
-
-    if selected_mode == "Find Destinations 🌍":
-        if st.session_state.selected_country is None:
-            st.markdown(f"<div style='text-align: center; color: #4CAF50; font-weight: bold; margin-bottom: 20px; font-size: 1.2em;'>🎉 We found {len(result_df)} trips you can afford!</div>", unsafe_allow_html=True)
-            
-            col_header, col_sort = st.columns([2, 1])
-            with col_header:
-                st.markdown("### Select a Country to Explore")
-            with col_sort:
-                sort_option = st.selectbox(
-                    "Sort By",
-                    options=["Best Value ⭐", "Popularity (High to Low)", "Price (Low to High)", "Price (High to Low)", "Name (A-Z)"],
-                    key="sort_selection", label_visibility="collapsed"
-                )
-            
-            # --- V11.0: Calculate Best Value Score based on FINAL Trip Cost ---
-            result_df['Calculated_Value_Score'] = (result_df['Perceived_Value'] * 1000) / result_df['Trip_Cost']
-            
-            # Rank for Badges (Global Rank within results)
-            result_df['Value_Rank'] = result_df['Calculated_Value_Score'].rank(ascending=False)
-            
-            country_groups = result_df.groupby('Full_Country').agg({
-                'Trip_Cost': 'min',
-                'Destination': 'count',
-                'iso_country': 'first',
-                'Popularity_Score': 'max',
-                'Calculated_Value_Score': 'max' # Take best city score
-            }).reset_index().rename(columns={'Trip_Cost': 'Min_Price', 'Destination': 'City_Count'})
-            
-            if sort_option == "Best Value ⭐":
-                country_groups = country_groups.sort_values(by='Calculated_Value_Score', ascending=False)
-            elif sort_option == "Popularity (High to Low)":
-                country_groups = country_groups.sort_values(by=['Popularity_Score', 'Min_Price'], ascending=[False, True])
-            elif sort_option == "Popularity (Low to High)":
-                country_groups = country_groups.sort_values(by=['Popularity_Score', 'Min_Price'], ascending=[True, True])
-            elif sort_option == "Price (Low to High)":
-                country_groups = country_groups.sort_values(by='Min_Price', ascending=True)
-            elif sort_option == "Price (High to Low)":
-                country_groups = country_groups.sort_values(by='Min_Price', ascending=False)
-            elif sort_option == "Name (A-Z)":
-                country_groups = country_groups.sort_values(by='Full_Country', ascending=True)
-            
-            # Pagination
-            if 'country_limit' not in st.session_state:
-                st.session_state.country_limit = 20
-                
-            visible_countries = country_groups.head(st.session_state.country_limit)
-            
-            cols = st.columns(3)
-            for idx, (index, c_row) in enumerate(visible_countries.iterrows()):
-                with cols[idx % 3]:
-                    country_name = c_row['Full_Country']
-                    iso_code = c_row['iso_country']
-                    formatted_price = f"${c_row['Min_Price']:,.0f}"
-                    
-                    # For Country Button: Use Emoji Flag
-                    emoji_flag = "".join(chr(127397 + ord(c)) for c in iso_code.upper()) if iso_code and len(iso_code)==2 else "🌐"
-                    
-                    btn_label = f"{emoji_flag} {country_name}\n\n{int(c_row['City_Count'])} Cities  |  From {formatted_price}"
-                    if st.button(btn_label, key=f"nav_{country_name}", use_container_width=True):
-                        st.session_state.selected_country = country_name
-                        st.session_state.sort_selection_city = st.session_state.sort_selection
+    if not result_df.empty:
+        # Get current Month for weather lookup
+        travel_dt = datetime.now() + timedelta(days=60)
+        month_col = travel_dt.strftime("%b") # e.g., "Mar"
+
+        if selected_mode == "Find Destinations 🌍":
+            if st.session_state.selected_country is None:
+                st.markdown(f"<div style='text-align: center; color: #4CAF50; font-weight: bold; margin-bottom: 20px; font-size: 1.2em;'>🎉 We found {len(result_df)} trips you can afford!</div>", unsafe_allow_html=True)
+
+                col_header, col_sort = st.columns([2, 1])
+                with col_header:
+                    st.markdown("### Select a Country to Explore")
+                with col_sort:
+                    sort_option = st.selectbox(
+                        "Sort By",
+                        options=["value", "popularity", "price", "price_desc", "name"],
+                        format_func=SORT_LABELS.get, key="sort_selection", label_visibility="collapsed"
+                    )
+
+                # --- V11.0: Calculate Best Value Score based on FINAL Trip Cost ---
+                result_df['Calculated_Value_Score'] = (result_df['Perceived_Value'] * 1000) / result_df['Trip_Cost']
+
+                # V12.0: Min price, city count, first ISO, max popularity & best city score per country
+                with stage("aggregate", rows=len(result_df)):
+                    country_groups = country_index.aggregate(result_df)
+
+                # Pagination
+                if 'country_limit' not in st.session_state:
+                    st.session_state.country_limit = 20
+
+                # V12.0: Only the visible page is ranked (argpartition + stable tie-breaks)
+                with stage("rank", rows=len(country_groups)):
+                    visible_countries = top_k_rows(
+                        country_groups, COUNTRY_SORT_KEYS.get(sort_option, COUNTRY_SORT_KEYS["value"]),
+                        st.session_state.country_limit
+                    )
+
+                cols = st.columns(3)
+                for idx, (index, c_row) in enumerate(visible_countries.iterrows()):
+                    with cols[idx % 3]:
+                        country_name = c_row['Full_Country']
+                        iso_code = c_row['iso_country']
+                        formatted_price = f"${c_row['Min_Price']:,.0f}"
+
+                        # For Country Button: Use Emoji Flag
+                        emoji_flag = "".join(chr(127397 + ord(c)) for c in iso_code.upper()) if iso_code and len(iso_code)==2 else "🌐"
+
+                        btn_label = f"{emoji_flag} {country_name}\n\n{int(c_row['City_Count'])} Cities  |  From {formatted_price}"
+                        if st.button(btn_label, key=f"nav_{country_name}", use_container_width=True):
+                            st.session_state.selected_country = country_name
+                            st.session_state.city_limit = CITY_PAGE_SIZE
+                            st.session_state.sort_selection_city = st.session_state.sort_selection
+                            st.rerun()
+
+                if len(country_groups) > st.session_state.country_limit:
+                    if st.button("Load More Countries", use_container_width=True):
+                        st.session_state.country_limit += 20
                         st.rerun()
-            
-            if len(country_groups) > st.session_state.country_limit:
-                if st.button("Load More Countries", use_container_width=True):
-                    st.session_state.country_limit += 20
+
+            else:
+                # Child View (City Level)
+                st.markdown("<div class='back-btn-wrapper'>", unsafe_allow_html=True)
+                if st.button("⬅️ Back to All Countries", key="back_btn"):
+                    st.session_state.selected_country = None
                     st.rerun()
+                st.markdown("</div>", unsafe_allow_html=True)
+
+                col_city_header, col_city_sort = st.columns([2, 1])
+                with col_city_header:
+                    st.markdown(f"### Exploring {st.session_state.selected_country}")
+                with col_city_sort:
+                    sort_option = st.selectbox(
+                        "Sort By",
+                        options=list(SORT_LABELS),
+                        format_func=SORT_LABELS.get, key="sort_selection_city", label_visibility="collapsed"
+                    )
+                    # Sync city sort back to master state if it changes
+                    if st.session_state.sort_selection_city != st.session_state.sort_selection:
+                        st.session_state.sort_selection = st.session_state.sort_selection_city
+                        st.rerun()
+
+                # Apply Hierarchical Sorting
+                result_df = result_df[result_df['Full_Country'] == st.session_state.selected_country].copy()
+
+                # Recalculate Value Score for this filtered set (optional, but consistent)
+                result_df['Calculated_Value_Score'] = (result_df['Perceived_Value'] * 1000) / result_df['Trip_Cost']
+
+                # Key V7.2.2 Fix: Use the city-specific key for the actual sorting logic here
+                city_sort = st.session_state.sort_selection_city
+                if 'city_limit' not in st.session_state:
+                    st.session_state.city_limit = CITY_PAGE_SIZE
+                city_count = len(result_df)
+                with stage("rank", rows=city_count):
+                    result_df = top_k_rows(
+                        result_df, CITY_SORT_KEYS.get(city_sort, CITY_SORT_KEYS["value"]), st.session_state.city_limit
+                    )
+
+                travel_date = travel_dt.strftime("%Y-%m-%d")
+                with stage("cards", rows=len(result_df)):
+                    cards = render_cards(result_df, month_col, origin_iata, travel_date, num_travelers, accom_tier_name)
+                cols = st.columns(3)
+
+                for idx, card_html in enumerate(cards):
+                    with cols[idx % 3]:
+                        st.markdown(card_html, unsafe_allow_html=True)
+
+                if city_count > st.session_state.city_limit:
+                    if st.button("Load More Cities", use_container_width=True):
+                        st.session_state.city_limit += CITY_PAGE_SIZE
+                        st.rerun()
 
         else:
-            # Child View (City Level)
-            st.markdown("<div class='back-btn-wrapper'>", unsafe_allow_html=True)
-            if st.button("⬅️ Back to All Countries", key="back_btn"):
-                st.session_state.selected_country = None
-                st.rerun()
-            st.markdown("</div>", unsafe_allow_html=True)
-                
-            col_city_header, col_city_sort = st.columns([2, 1])
-            with col_city_header:
-                st.markdown(f"### Exploring {st.session_state.selected_country}")
-            with col_city_sort:
-                sort_option = st.selectbox(
-                    "Sort By",
-                    options=["Best Value ⭐", "Popularity (High to Low)", "Popularity (Low to High)", "Price (Low to High)", "Price (High to Low)", "Name (A-Z)"],
-                    key="sort_selection_city", label_visibility="collapsed"
-                )
-                # Sync city sort back to master state if it changes
-                if st.session_state.sort_selection_city != st.session_state.sort_selection:
-                    st.session_state.sort_selection = st.session_state.sort_selection_city
-                    st.rerun()
-            
-            # Apply Hierarchical Sorting
-            result_df = result_df[result_df['Full_Country'] == st.session_state.selected_country].copy()
-            
-            # Recalculate Value Score for this filtered set (optional, but consistent)
-            result_df['Calculated_Value_Score'] = (result_df['Perceived_Value'] * 1000) / result_df['Trip_Cost']
-            
-            # Key V7.2.2 Fix: Use the city-specific key for the actual sorting logic here
-            city_sort = st.session_state.sort_selection_city
-            if city_sort == "Best Value ⭐":
-                result_df = result_df.sort_values(by='Calculated_Value_Score', ascending=False)
-            elif city_sort == "Popularity (High to Low)":
-                result_df = result_df.sort_values(by=['Popularity_Score', 'Trip_Cost'], ascending=[False, True])
-            elif city_sort == "Popularity (Low to High)":
-                result_df = result_df.sort_values(by=['Popularity_Score', 'Trip_Cost'], ascending=[True, True])
-            elif city_sort == "Price (Low to High)":
-                result_df = result_df.sort_values(by='Trip_Cost', ascending=True)
-            elif city_sort == "Price (High to Low)":
-                result_df = result_df.sort_values(by='Trip_Cost', ascending=False)
-            elif city_sort == "Name (A-Z)":
-                result_df = result_df.sort_values(by='Destination', ascending=True)
-            
+            # Price a Trip or Maximize Days
+            st.markdown("### Trip Breakdown")
             travel_date = travel_dt.strftime("%Y-%m-%d")
+            with stage("cards", rows=len(result_df)):
+                cards = render_cards(result_df, month_col, origin_iata, travel_date, num_travelers, accom_tier_name)
             cols = st.columns(3)
-            
-            for idx, (index, row) in enumerate(result_df.iterrows()):
+
+            for idx, card_html in enumerate(cards):
                 with cols[idx % 3]:
-                    activities_html = "".join([f"<span class='activity-badge'>{ACTIVITY_EMOJIS.get(act, '🎯')} {act}</span>" for act in row['Activities']])
-                    iata_code = row['IATA']
-                    search_query = quote(row['Search_Term'])
-                    
-                    #MANUAL ATTENTION REQUIRED - Flight suffix only works for Business Class
-                    #flight_suffix = "+Business+Class" if "Luxury" in flight_class_name else ""
-                    #flight_url = f"https://www.google.com/travel/flights?q=Flights+from+{origin_iata}+to+{iata_code}+on+{travel_date}{flight_suffix}"
-                    ##TODO: Affiliate link generation can be abstracted into a function - START
-                    try:
-                        if isinstance(travel_date, str):
-                            from datetime import datetime
-                            # Converts '2024-10-25' -> '2510'
-                            av_date = datetime.strptime(travel_date, '%Y-%m-%d').strftime('%d%m')
-                        else:
-                            # Handles if it's already a python date object
-                            av_date = travel_date.strftime('%d%m')
-                    except Exception:
-                        # Fallback safety
-                        av_date = str(travel_date).replace("-", "")[-4:]
-
-                    # 2. Create the Aviasales Deep Link
-                    # Structure: Origin + Date(DDMM) + Destination + NumTravelers + Marker
-                    flight_url = f"https://www.aviasales.com/search/{origin_iata}{av_date}{iata_code}{num_travelers}?marker=699995"
-                    hotel_url = get_booking_url(row['Search_Term'], accom_tier_name, travel_date)
-                    ##Affiliate link generation can be abstracted into a function - END
-
-                    # Weather V6.2: Dual C/F Metric
-                    temp_c = row[month_col]
-                    if pd.notna(temp_c):
-                        temp_f = (temp_c * 9/5) + 32
-                        weather_label = f"{temp_c:.1f}°C ({temp_f:.0f}°F)"
-                    else:
-                        weather_label = "Season-dependent"
-                    
-                    # Badge Logic
-                    badge_html = ""
-                    if row.get('Value_Rank', 999) <= 10:
-                        badge_html = "<div style='position: absolute; top: -10px; right: -10px; background: #FFD700; color: #000; padding: 5px 10px; border-radius: 20px; font-weight: bold; font-size: 0.8em; box-shadow: 0 2px 5px rgba(0,0,0,0.3);'>⭐ Best Value</div>"
-
-                    # SVG Flag for Card
-                    flag_svg = get_flag_emoji(row['iso_country'])
-
-                    # Build card HTML as single line to avoid markdown interpretation
-                    card_html = f'<div style="background-color: #262730; padding: 20px; border-radius: 15px; box-shadow: 0 4px 12px rgba(0,0,0,0.4); border: 1px solid #333; margin-bottom: 20px; min-height: 520px; display: flex; flex-direction: column; justify-content: space-between; position: relative;">{badge_html}<div style="color: #fff; font-size: 1.4em; font-weight: bold; margin-bottom: 8px;">{flag_svg} {row["Destination"]}</div><div style="color: #aaa; font-size: 0.85em; margin-bottom: 12px;">{row["Region"]} • {weather_label}</div><div style="margin: 12px 0;">{activities_html}</div><div style="text-align: center; margin: 20px 0; padding: 10px; background: rgba(0, 212, 189, 0.1); border-radius: 10px;"><div style="color: #00E676; font-size: 2.8em; font-weight: 800; margin: 0; line-height: 1;">${row["Trip_Cost"]:,.0f}</div><div style="color: #aaa; font-size: 0.9em; margin-top: 5px;">Approx. ${row["Trip_Cost"] / num_travelers:,.0f} per person</div></div><div style="color: #ccc; font-size: 0.85em; border-top: 1px solid #444; padding-top: 12px; margin-top: 10px;"><p style="margin: 5px 0;"><strong>✈️ Flight:</strong> ${row["Total_Flight_Group"]:,.0f}</p><p style="margin: 5px 0;"><strong>🏨 Hotel:</strong> ${row["Daily_Hotel_Group"]:,.0f}/day</p><p style="margin: 5px 0;"><strong>🍽️ Daily spend:</strong> ${row["Daily_Food_Group"] + row["Daily_Transport_Group"]:,.0f}</p></div><a href="{flight_url}" target="_blank" style="display: inline-block; width: 100%; padding: 12px; margin-top: 10px; background: linear-gradient(135deg, #00D4BD 0%, #2E86DE 100%); color: white; text-decoration: none; border-radius: 8px; font-weight: bold; text-align: center;">✈️ Book Flight</a><a href="{hotel_url}" target="_blank" style="display: inline-block; width: 100%; padding: 12px; margin-top: 10px; background: linear-gradient(135deg, #00D4BD 0%, #2E86DE 100%); color: white; text-decoration: none; border-radius: 8px; font-weight: bold; text-align: center;">🏨 Book Hotel</a></div>'
                     st.markdown(card_html, unsafe_allow_html=True)
-
     else:
-        # Price a Trip or Maximize Days
-        st.markdown("### Trip Breakdown")
-        travel_date = travel_dt.strftime("%Y-%m-%d")
-        cols = st.columns(3)
-        
-        for idx, (index, row) in enumerate(result_df.iterrows()):
-            with cols[idx % 3]:
-                activities_html = "".join([f"<span class='activity-badge'>{ACTIVITY_EMOJIS.get(act, '🎯')} {act}</span>" for act in row['Activities']])
-                iata_code = row['IATA']
-                search_query = quote(row['Search_Term'])
-                
-                #MANUAL ATTENTION REQUIRED - Flight suffix only works for Business Class
-                #flight_suffix = "+Business+Class" if "Luxury" in flight_class_name else ""
-                #flight_url = f"https://www.google.com/travel/flights?q=Flights+from+{origin_iata}+to+{iata_code}+on+{travel_date}{flight_suffix}"
-                # 1. Format the date to DDMM (Required for Aviasales)
-                ##TODO:Affiliate link generation can be abstracted into a function - START
-                try:
-                    if isinstance(travel_date, str):
-                        from datetime import datetime
-                        # Converts '2024-10-25' -> '2510'
-                        av_date = datetime.strptime(travel_date, '%Y-%m-%d').strftime('%d%m')
-                    else:
-                        # Handles if it's already a python date object
-                        av_date = travel_date.strftime('%d%m')
-                except Exception:
-                    # Fallback safety
-                    av_date = str(travel_date).replace("-", "")[-4:]
-
-                # 2. Create the Aviasales Deep Link
-                # Structure: Origin + Date(DDMM) + Destination + NumTravelers + Marker
-                flight_url = f"https://www.aviasales.com/search/{origin_iata}{av_date}{iata_code}{num_travelers}?marker=699995"
-                hotel_url = get_booking_url(row['Search_Term'], accom_tier_name, travel_date)
-                ##Affiliate link generation can be abstracted into a function - END
-
-                # Weather V6.2: Dual C/F Metric
-                temp_c = row[month_col]
-                if pd.notna(temp_c):
-                    temp_f = (temp_c * 9/5) + 32
-                    weather_label = f"{temp_c:.1f}°C ({temp_f:.0f}°F)"
-                else:
-                    weather_label = "Season-dependent"
-                
-                # SVG Flag for Card
-                flag_svg = get_flag_emoji(row['iso_country'])
-
-                # Build card HTML as single line to avoid markdown interpretation
-                card_html = f'<div style="background-color: #262730; padding: 20px; border-radius: 15px; box-shadow: 0 4px 12px rgba(0,0,0,0.4); border: 1px solid #333; margin-bottom: 20px; min-height: 520px; display: flex; flex-direction: column; justify-content: space-between;"><div style="color: #fff; font-size: 1.4em; font-weight: bold; margin-bottom: 8px;">{flag_svg} {row["Destination"]}</div><div style="color: #aaa; font-size: 0.85em; margin-bottom: 12px;">{row["Region"]} • {weather_label}</div><div style="margin: 12px 0;">{activities_html}</div><div style="text-align: center; margin: 20px 0; padding: 10px; background: rgba(0, 212, 189, 0.1); border-radius: 10px;"><div style="color: #00E676; font-size: 2.8em; font-weight: 800; margin: 0; line-height: 1;">${row["Trip_Cost"]:,.0f}</div><div style="color: #aaa; font-size: 0.9em; margin-top: 5px;">Approx. ${row["Trip_Cost"] / num_travelers:,.0f} per person</div></div><div style="color: #ccc; font-size: 0.85em; border-top: 1px solid #444; padding-top: 12px; margin-top: 10px;"><p style="margin: 5px 0;"><strong>✈️ Flight:</strong> ${row["Total_Flight_Group"]:,.0f}</p><p style="margin: 5px 0;"><strong>🏨 Hotel:</strong> ${row["Daily_Hotel_Group"]:,.0f}/day</p><p style="margin: 5px 0;"><strong>🍽️ Daily spend:</strong> ${row["Daily_Food_Group"] + row["Daily_Transport_Group"]:,.0f}</p></div><a href="{flight_url}" target="_blank" style="display: inline-block; width: 100%; padding: 12px; margin-top: 10px; background: linear-gradient(135deg, #00D4BD 0%, #2E86DE 100%); color: white; text-decoration: none; border-radius: 8px; font-weight: bold; text-align: center;">✈️ Book Flight</a><a href="{hotel_url}" target="_blank" style="display: inline-block; width: 100%; padding: 12px; margin-top: 10px; background: linear-gradient(135deg, #00D4BD 0%, #2E86DE 100%); color: white; text-decoration: none; border-radius: 8px; font-weight: bold; text-align: center;">🏨 Book Hotel</a></div>'
-                st.markdown(card_html, unsafe_allow_html=True)
-else:
-    st.warning("😔 No destinations found matching your criteria.")
-
-# --- SEO & About Section ---
-st.divider()  # Adds a visual line separator
-
-with st.expander("ℹ️ About WanderWise & How it Works", expanded=True):
-    st.markdown("""
+        st.warning("😔 No destinations found matching your criteria.")
+
+    # --- SEO & About Section ---
+    st.divider()  # Adds a visual line separator
+
+    with st.expander("ℹ️ About WanderWise & How it Works", expanded=True):
+        st.markdown("""
     ### **The Intelligent Reverse Trip Planner**
     
     **WanderWise** is a **reverse flight search engine** designed for budget travelers who want to maximize their experiences. Instead of asking *"Where do you want to go?"*, we ask *"What is your budget?"* and show you every possibility.
@@ -975,9 +741,11 @@ with st.expander("ℹ️ About WanderWise & How it Works", expanded=True):
     
     *Built with ❤️ for travelers who want to see the world without breaking the bank.*
     """)
-    st.divider() # Adds a nice visual separation line
-    st.markdown("### 📚 Want expert travel tips?")
-    st.markdown(
-        "Check out the **[WanderWise Travel Blog](https://blog.reversetripsearch.com)** "
-        "for in-depth guides on how to find cheap flights, budget hacks, and hidden gem destinations."
-    )
\ No newline at end of file
+        st.divider() # Adds a nice visual separation line
+        st.markdown("### 📚 Want expert travel tips?")
+        st.markdown(
+            "Check out the **[WanderWise Travel Blog](https://blog.reversetripsearch.com)** "
+            "for in-depth guides on how to find cheap flights, budget hacks, and hidden gem destinations."
+        )
+finally:
+    run.finish()
@@ -0,0 +1,248 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from distance import apply_fares, distances_from, flight_base_cost, load_travel_matrices
+from trip_engine import TravelStyle, daily_group_costs, flight_group_cost
+
+# --- V12.0: Batch Scenario Evaluator ---
+# "Where can $X take you from city Y" for whole grids of origins x travelers x durations x budgets.
+# For a fixed (origin, travelers) every destination costs flight + daily * duration, so one sort per
+# duration answers every budget at once via searchsorted.
+
+
+class BatchResult(NamedTuple):
+    """Scenario grid results, indexed [origin, travelers, duration, budget]"""
+    origins: list
+    travelers: np.ndarray
+    durations: np.ndarray
+    budgets: np.ndarray
+    counts: np.ndarray          # (O, T, D, B) affordable destinations per scenario
+    cheapest_idx: np.ndarray    # (O, T, D, k) destination row positions, cheapest first, -1 padded
+    cheapest_cost: np.ndarray   # (O, T, D, k) matching Trip_Cost, inf padded
+
+    def top_k(self, o, t, d, b, k=None):
+        """Row positions of the cheapest affordable destinations for one scenario"""
+        k = self.cheapest_idx.shape[-1] if k is None else min(k, self.cheapest_idx.shape[-1])
+        n = min(int(self.counts[o, t, d, b]), k)
+        return self.cheapest_idx[o, t, d, :n]
+
+    def to_frame(self):
+        """Long-format (origin, travelers, duration, budget, count) table"""
+        o, t, d, b = np.indices(self.counts.shape).reshape(4, -1)
+        return pd.DataFrame({
+            'Origin': np.asarray(self.origins, dtype=object)[o],
+            'Travelers': self.travelers[t],
+            'Duration': self.durations[d],
+            'Budget': self.budgets[b],
+            'Destination_Count': self.counts.reshape(-1),
+        })
+
+
+class CostInputs(NamedTuple):
+    """Plain NumPy view of the destination columns the cost model needs"""
+    lats: np.ndarray
+    lons: np.ndarray
+    iata: np.ndarray
+    daily_base: np.ndarray
+    transport_daily: np.ndarray
+    eligible: np.ndarray        # False rows can never be returned (e.g. filtered out by region)
+
+
+def cost_inputs(destinations, style=TravelStyle(), dest_mask=None):
+    """Extract the arrays used by evaluate_origin from the enriched destinations frame"""
+    daily_col = 'Daily_Cost_Luxury' if style.luxury_stay else 'Daily_Cost_Budget'
+    eligible = np.ones(len(destinations), dtype=bool) if dest_mask is None else np.asarray(dest_mask, dtype=bool)
+    return CostInputs(
+        lats=destinations['latitude_deg'].to_numpy(dtype=np.float64),
+        lons=destinations['longitude_deg'].to_numpy(dtype=np.float64),
+        iata=destinations['IATA'].to_numpy(dtype=str),  # Fixed-width so it can live in shared memory
+        daily_base=destinations[daily_col].to_numpy(dtype=np.float64),
+        transport_daily=destinations['Transport_Cost_Daily'].to_numpy(dtype=np.float64),
+        eligible=eligible,
+    )
+
+
+def _flight_base_row(inputs, origin_pos, matrices=None, dest_positions=None, fares=None, fare_positions=None):
+    rows = None
+    if matrices is not None and dest_positions is not None:
+        rows = matrices.origin_rows(inputs.iata[origin_pos], dest_positions)
+    if rows is not None:
+        flight_base = rows[1]
+    else:
+        distance_km = distances_from(inputs.lats[origin_pos], inputs.lons[origin_pos], inputs.lats, inputs.lons)
+        flight_base = flight_base_cost(distance_km)
+    if fares is not None and fare_positions is not None:
+        flight_base = apply_fares(flight_base, fares, inputs.iata[origin_pos], fare_positions)
+    return flight_base
+
+
+def evaluate_origin(inputs, origin_pos, budgets, durations, travelers, style=TravelStyle(), top_k=10,
+                    matrices=None, dest_positions=None, fares=None, fare_positions=None):
+    """All scenarios for one origin. Returns (counts (T, D, B), cheapest_idx (T, D, k), cheapest_cost (T, D, k))."""
+    budgets = np.asarray(budgets, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+    k = min(top_k, len(inputs.lats))
+
+    flight_base = _flight_base_row(inputs, origin_pos, matrices, dest_positions, fares, fare_positions)
+    excluded = ~inputs.eligible
+    excluded[origin_pos] = True  # Never send someone to the city they start in
+
+    counts = np.zeros((len(travelers), len(durations), len(budgets)), dtype=np.int32)
+    cheapest_idx = np.full((len(travelers), len(durations), top_k), -1, dtype=np.int32)
+    cheapest_cost = np.full((len(travelers), len(durations), top_k), np.inf)
+
+    for ti, num_travelers in enumerate(travelers):
+        num_travelers = int(num_travelers)
+        hotel, food, transport = daily_group_costs(inputs.daily_base, inputs.transport_daily, num_travelers, style)
+        total_daily = food + hotel + transport
+        total_flight = flight_group_cost(flight_base, num_travelers, style)
+
+        # (D, M): Trip_Cost = Total_Flight_Group + Total_Daily_Group * duration
+        trip_cost = total_flight[None, :] + (total_daily[None, :] * durations[:, None])
+        trip_cost[:, excluded] = np.inf
+        sorted_cost = np.sort(trip_cost, axis=1)
+        for di in range(len(durations)):
+            counts[ti, di] = np.searchsorted(sorted_cost[di], budgets, side='right')
+
+        # Only the k cheapest need an ordering: partition, then sort those k by (cost, row)
+        cheapest = np.sort(np.argpartition(trip_cost, k - 1, axis=1)[:, :k], axis=1)
+        cheapest_trip_cost = np.take_along_axis(trip_cost, cheapest, axis=1)
+        order = np.argsort(cheapest_trip_cost, axis=1, kind='stable')
+        cheapest_idx[ti, :, :k] = np.take_along_axis(cheapest, order, axis=1)
+        cheapest_cost[ti, :, :k] = np.take_along_axis(cheapest_trip_cost, order, axis=1)
+
+    cheapest_idx[~np.isfinite(cheapest_cost)] = -1
+    return counts, cheapest_idx, cheapest_cost
+
+
+def resolve_origins(destinations, origins):
+    """Row positions for origin Destination names (KeyError on unknown names)"""
+    positions = pd.Index(destinations['Destination']).get_indexer(pd.Index(origins))
+    if (positions < 0).any():
+        missing = [o for o, p in zip(origins, positions) if p < 0]
+        raise KeyError(f"Unknown origin cities: {missing[:5]}")
+    return positions
+
+
+# --- V12.0: Process-Pool Sharding ---
+# Workers attach to the destination arrays through shared memory and re-open the distance matrices
+# via mmap, so nothing destination-sized is pickled per task. Only origin chunks and results move.
+# The fare index covers ~100 airports, so it is simply pickled once per worker.
+
+_WORKER = {}
+
+
+def _share_arrays(arrays):
+    """Copy named arrays into shared memory blocks. Returns (blocks, spec) where spec is picklable."""
+    blocks, spec = [], {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        blocks.append(shm)
+        spec[name] = (shm.name, arr.shape, arr.dtype.str)
+    return blocks, spec
+
+
+def _attach_arrays(spec):
+    blocks, arrays = [], {}
+    for name, (shm_name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        blocks.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    return blocks, arrays
+
+
+def _init_worker(spec, params, matrix_dir, fares):
+    blocks, arrays = _attach_arrays(spec)
+    dest_positions = arrays.pop('dest_positions', None)
+    fare_positions = arrays.pop('fare_positions', None)
+    _WORKER.update(
+        blocks=blocks,  # Keep the mappings alive for the life of the worker
+        inputs=CostInputs(**arrays),
+        dest_positions=dest_positions,
+        matrices=load_travel_matrices(matrix_dir) if matrix_dir is not None else None,
+        fares=fares,
+        fare_positions=fare_positions,
+        params=params,
+    )
+
+
+def _evaluate_chunk(origin_positions):
+    budgets, durations, travelers, style, top_k = _WORKER['params']
+    results = [
+        evaluate_origin(_WORKER['inputs'], origin_pos, budgets, durations, travelers, style, top_k,
+                        _WORKER['matrices'], _WORKER['dest_positions'], _WORKER['fares'], _WORKER['fare_positions'])
+        for origin_pos in origin_positions
+    ]
+    return tuple(np.stack(part) for part in zip(*results))
+
+
+def _evaluate_parallel(inputs, origin_positions, budgets, durations, travelers, style, top_k, matrices,
+                       dest_positions, fares, fare_positions, workers):
+    arrays = inputs._asdict()
+    if dest_positions is not None:
+        arrays['dest_positions'] = dest_positions
+    if fare_positions is not None:
+        arrays['fare_positions'] = fare_positions
+    blocks, spec = _share_arrays(arrays)
+    params = (budgets, durations, travelers, style, top_k)
+    matrix_dir = matrices.data_dir if matrices is not None else None
+
+    # A few chunks per worker keeps everyone busy without per-origin task overhead
+    chunks = [c for c in np.array_split(origin_positions, workers * 4) if len(c)]
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(spec, params, matrix_dir, fares)) as pool:
+            parts = list(pool.map(_evaluate_chunk, chunks))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    return tuple(np.concatenate(part) for part in zip(*parts))
+
+
+def evaluate_scenarios(destinations, origins, budgets, durations, travelers=(1,), style=TravelStyle(),
+                       top_k=10, matrices=None, dest_mask=None, workers=1, fares=None):
+    """Evaluate the full origins x travelers x durations x budgets grid in one call.
+
+    destinations is the enriched frame (see trip_engine.enrich_data); origins are Destination names.
+    dest_mask optionally restricts which destinations may be returned (region/activity filters).
+    fares is an optional FareIndex; covered airport pairs are priced from it instead of by distance.
+    workers > 1 shards origins across a process pool (None = one worker per core).
+    """
+    origins = list(origins)
+    budgets = np.asarray(budgets, dtype=np.float64)
+    durations = np.asarray(durations)
+    travelers = np.asarray(travelers)
+    origin_positions = resolve_origins(destinations, origins)
+    inputs = cost_inputs(destinations, style, dest_mask)
+    dest_positions = matrices.positions(destinations['IATA']) if matrices is not None else None
+    fare_positions = fares.positions(destinations['IATA']) if fares is not None else None
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(origins))
+
+    if workers > 1:
+        counts, cheapest_idx, cheapest_cost = _evaluate_parallel(
+            inputs, origin_positions, budgets, durations, travelers, style, top_k, matrices, dest_positions,
+            fares, fare_positions, workers
+        )
+        return BatchResult(origins, travelers, durations, budgets, counts, cheapest_idx, cheapest_cost)
+
+    counts = np.zeros((len(origins), len(travelers), len(durations), len(budgets)), dtype=np.int32)
+    cheapest_idx = np.full((len(origins), len(travelers), len(durations), top_k), -1, dtype=np.int32)
+    cheapest_cost = np.full((len(origins), len(travelers), len(durations), top_k), np.inf)
+
+    for oi, origin_pos in enumerate(origin_positions):
+        counts[oi], cheapest_idx[oi], cheapest_cost[oi] = evaluate_origin(
+            inputs, origin_pos, budgets, durations, travelers, style, top_k, matrices, dest_positions,
+            fares, fare_positions
+        )
+
+    return BatchResult(origins, travelers, durations, budgets, counts, cheapest_idx, cheapest_cost)
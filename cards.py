@@ -0,0 +1,104 @@
+from functools import lru_cache
+from urllib.parse import quote
+
+import pandas as pd
+
+from trip_engine import mask_to_activities
+
+# --- V12.0: Destination Card Templates ---
+# Card styling lives in the page's CSS classes, not inline on every card. The per-destination
+# parts (flag, name, region, weather, activity badges) are rendered once and cached; a rerun only
+# formats the prices and booking links into one shared template.
+
+ACTIVITY_EMOJIS = {
+    'Beach': '🏖️',
+    'Hiking': '🥾',
+    'Caves': '🕳️',
+    'Skiing': '⛷️',
+    'History': '🏛️',
+    'Nightlife': '🌃',
+    'Foodie': '🍽️',
+    'Nature': '🌲',
+    'Adventure': '🏔️'
+}
+
+# Single line so st.markdown never treats any of it as markdown
+CARD_TEMPLATE = (
+    '<div class="travel-card">{header}'
+    '<div class="price-container"><div class="price-big">${trip_cost:,.0f}</div>'
+    '<div class="price-small">Approx. ${per_person:,.0f} per person</div></div>'
+    '<div class="breakdown"><p><strong>✈️ Flight:</strong> ${flight:,.0f}</p>'
+    '<p><strong>🏨 Hotel:</strong> ${hotel:,.0f}/day</p>'
+    '<p><strong>🍽️ Daily spend:</strong> ${daily_spend:,.0f}</p></div>'
+    '<a href="{flight_url}" target="_blank" class="booking-button">✈️ Book Flight</a>'
+    '<a href="{hotel_url}" target="_blank" class="booking-button">🏨 Book Hotel</a></div>'
+)
+
+
+@lru_cache(maxsize=512)
+def get_flag_emoji(country_code):
+    """V11.0: Helper to convert ISO country code to SVG Flag URL"""
+    if not country_code or len(country_code) != 2:
+        return ""
+    # Returns an HTML img tag for the flag
+    return f"<img src='https://flagcdn.com/48x36/{country_code.lower()}.png' class='card-flag' width='32'>"
+
+
+def get_booking_url(search_term, level, checkin_date):
+    """V10.0: Precision Hotel Routing using Booking.com filters (nflt)"""
+    base_url = f"https://www.booking.com/searchresults.html?ss={quote(search_term)}&checkin={checkin_date}"
+
+    if "Luxury" in level:
+        # V10.2: 5-star only
+        return f"{base_url}&nflt=class%3D5"
+    elif "Economy" in level:
+        # V10.2: 4-star, 3-star, 2-star
+        return f"{base_url}&nflt=class%3D4%3Bclass%3D3%3Bclass%3D2"
+    else:
+        # V10.0: Bare Essentials: 2-star, 1-star
+        return f"{base_url}&nflt=class%3D2%3Bclass%3D1"
+
+
+def weather_label(temp_c):
+    """Weather V6.2: Dual C/F Metric"""
+    if temp_c is None or pd.isna(temp_c):
+        return "Season-dependent"
+    return f"{temp_c:.1f}°C ({temp_c * 9/5 + 32:.0f}°F)"
+
+
+@lru_cache(maxsize=4096)
+def card_header(destination, region, iso_country, activity_mask, weather):
+    """Static top of a destination card: flag, name, region, weather and activity badges"""
+    activities = "".join(
+        f"<span class='activity-badge'>{ACTIVITY_EMOJIS.get(act, '🎯')} {act}</span>"
+        for act in mask_to_activities(activity_mask)
+    )
+    return (
+        f'<div class="card-header">{get_flag_emoji(iso_country)} {destination}</div>'
+        f'<div class="card-metadata">{region} • {weather}</div>'
+        f'<div class="card-activities">{activities}</div>'
+    )
+
+
+def render_cards(result_df, month_col, origin_iata, travel_date, num_travelers, accom_tier_name):
+    """Card HTML for every row of result_df, in row order"""
+    # Aviasales wants the departure date as DDMM; parse it once per rerun, not once per card
+    av_date = pd.Timestamp(travel_date).strftime('%d%m')
+    columns = ['Destination', 'Region', 'iso_country', 'Activity_Mask', month_col, 'IATA', 'Search_Term',
+               'Trip_Cost', 'Total_Flight_Group', 'Daily_Hotel_Group', 'Daily_Food_Group', 'Daily_Transport_Group']
+    cards = []
+    for (destination, region, iso, mask, temp_c, iata, search_term,
+         trip_cost, flight, hotel, food, transport) in result_df[columns].itertuples(index=False, name=None):
+        header = card_header(destination, region, iso if isinstance(iso, str) else None, int(mask), weather_label(temp_c))
+        cards.append(CARD_TEMPLATE.format(
+            header=header,
+            trip_cost=trip_cost,
+            per_person=trip_cost / num_travelers,
+            flight=flight,
+            hotel=hotel,
+            daily_spend=food + transport,
+            # Structure: Origin + Date(DDMM) + Destination + NumTravelers + Marker
+            flight_url=f"https://www.aviasales.com/search/{origin_iata}{av_date}{iata}{num_travelers}?marker=699995",
+            hotel_url=get_booking_url(search_term, accom_tier_name, travel_date),
+        ))
+    return cards
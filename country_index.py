@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+# --- V12.0: Country Aggregates ---
+# Country ids are fixed per dataset version, so they are factorized once. A rerun then only needs
+# a few ufunc reductions over the result rows' ids instead of a hash groupby on country names.
+
+
+class CountryIndex:
+    """Dataset-wide country ids (sorted by name, like groupby) for every destination row"""
+
+    def __init__(self, destinations):
+        codes, names = pd.factorize(destinations['Full_Country'], sort=True)
+        self.codes = codes.astype(np.int32)   # -1 where Full_Country is missing
+        self.names = np.asarray(names, dtype=object)
+        self.row_index = destinations.index
+
+    def result_codes(self, result_df):
+        """Country id of every result row (result rows keep their dataset index labels)"""
+        return self.codes[self.row_index.get_indexer(result_df.index)]
+
+    def aggregate(self, result_df):
+        """Per-country Min_Price, City_Count, iso_country, Popularity_Score and Calculated_Value_Score.
+
+        Same rows and values as the old groupby('Full_Country').agg(...): NaN countries dropped,
+        'first' iso_country in row order, NaN-skipping min/max, countries in name order.
+        """
+        codes = self.result_codes(result_df)
+        valid = codes >= 0
+        codes = codes[valid]
+        n = len(self.names)
+
+        city_count = np.bincount(codes, minlength=n)
+        min_price = np.full(n, np.nan)
+        np.fmin.at(min_price, codes, result_df['Trip_Cost'].to_numpy(dtype=np.float64)[valid])
+        popularity = np.full(n, np.nan)
+        np.fmax.at(popularity, codes, result_df['Popularity_Score'].to_numpy(dtype=np.float64)[valid])
+        value_score = np.full(n, np.nan)
+        np.fmax.at(value_score, codes, result_df['Calculated_Value_Score'].to_numpy(dtype=np.float64)[valid])
+
+        # 'first' skips missing values, so take each country's first result row with an ISO code
+        iso = result_df['iso_country']
+        has_iso = iso.notna().to_numpy()[valid]
+        first_row = np.full(n, len(result_df))
+        np.minimum.at(first_row, codes[has_iso], np.flatnonzero(valid)[has_iso])
+        iso_first = np.full(n, None, dtype=object)
+        found = first_row < len(result_df)
+        iso_first[found] = iso.iloc[first_row[found]].to_numpy(dtype=object)
+
+        present = np.flatnonzero(city_count > 0)
+        return pd.DataFrame({
+            'Full_Country': self.names[present],
+            'Min_Price': min_price[present],
+            'City_Count': city_count[present],
+            'iso_country': iso_first[present],
+            'Popularity_Score': popularity[present],
+            'Calculated_Value_Score': value_score[present],
+        })
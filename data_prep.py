@@ -3,6 +3,31 @@ import numpy as np
 import pycountry
 import math
 import re
+import hashlib
+import os
+import json
+import logging
+import shutil
+import argparse
+import sys
+import time
+import urllib.request
+from contextlib import contextmanager
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import NamedTuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from distance import (
+    save_travel_matrices, save_fare_index, load_fare_index, FareIndex, DISTANCE_MATRIX_FILE, FLIGHT_BASE_MATRIX_FILE,
+    MATRIX_INDEX_FILE, FARE_MATRIX_FILE, FARE_INDEX_FILE,
+)
+
+logger = logging.getLogger("wanderwise.data_prep")
 
 # --- Constants & Helpers ---
 ISO_TO_REGION = {
@@ -74,13 +99,39 @@ COUNTRY_POPULARITY = {
     'Argentina': 36, 'Iceland': 35, 'Ireland': 34, 'New Zealand': 32, 'Norway': 30,
 }
 
-def clean_temp(val):
-    if pd.isna(val): return np.nan
-    try:
-        match = re.search(r'([-+]?\d*\.\d+|\d+)', str(val))
-        return float(match.group(1)) if match else np.nan
-    except:
-        return np.nan
+# --- V12.0: Weather Table ---
+# Cells look like "11.2\n(52.2)": Celsius first, Fahrenheit in brackets. The first number is the one we keep.
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+TEMP_PATTERN = re.compile(r'([-+]?\d*\.\d+|\d+)')
+
+class WeatherTable(NamedTuple):
+    """Parsed avg_temp_cities.csv: one row of monthly Celsius temperatures per (City, Country)"""
+    keys: pd.DataFrame         # City, Country
+    temps: np.ndarray          # (N, 12) month matrix, NaN where a cell had no number
+    country_avg: pd.DataFrame  # Country + 12 month columns, the fallback for unmatched cities
+
+    def frame(self):
+        """City, Country + month columns, the layout the merge stage joins on"""
+        return self.keys.join(pd.DataFrame(self.temps, columns=MONTHS, index=self.keys.index))
+
+def parse_weather(df_weather, dtype=np.float32):
+    """V12.0: Vectorized month-cell parser; every cell goes through a single str.extract call.
+
+    The build passes dtype=np.float64 so the master CSV keeps the exact values it always had.
+    """
+    cells = pd.Series(df_weather[MONTHS].to_numpy().ravel()).astype(str)
+    temps = cells.str.extract(TEMP_PATTERN, expand=False).astype('float64').to_numpy()
+    temps = temps.reshape(len(df_weather), len(MONTHS)).astype(dtype, copy=False)
+
+    keys = df_weather[['City', 'Country']].reset_index(drop=True)
+    country_avg = (
+        pd.DataFrame(temps, columns=MONTHS).groupby(keys['Country'].to_numpy()).mean()
+        .rename_axis('Country').reset_index()
+    )
+    return WeatherTable(keys, temps, country_avg)
+
+def load_weather(path, dtype=np.float32):
+    return parse_weather(pd.read_csv(path), dtype)
 
 # --- V9.0: GLOBAL TRAVEL ANCHORS (Top-Tier Destinations) ---
 TIER_1_ANCHORS = {
@@ -100,31 +151,396 @@ TIER_2_ANCHORS = {
 
 GLOBAL_GATEWAYS = {'LHR', 'CDG', 'JFK', 'HND', 'DXB', 'SIN', 'HKG', 'IST', 'AMS', 'FRA', 'PEK', 'HND', 'ICN'}
 
-def run_data_prep():
-    print("🚀 Starting WanderWise V9.0 Build-Time Data Engine...")
-    
-    # 1. Load All 4 Raw Inputs
-    airports_url = "https://davidmegginson.github.io/ourairports-data/airports.csv"
-    df_airports = pd.read_csv(airports_url)
-    df_col_country = pd.read_csv("Cost_of_Living_Index_by_Country_2024.csv")
+REGION_SEASONALITY = {
+    'Europe': "Summer Peak (Jun-Aug)",
+    'Asia': "Varies (Nov-Mar ideal)",
+    'Oceania': "Winter Peak (Dec-Feb)",
+}
+
+LEGACY_HUBS = ['CDG', 'LHR', 'HND', 'JFK']
+
+def calculate_popularity(df):
+    """V9.0 popularity (10-100) from country, anchor tier, hub density, gateway and airport type"""
+    score = df['Full_Country'].map(COUNTRY_POPULARITY).fillna(10) * 0.3 # Base (Max 30)
+
+    city_name = df['Clean_City'].astype(str)
+    score = score + np.select(
+        [city_name.isin(TIER_1_ANCHORS), city_name.isin(TIER_2_ANCHORS)], [40, 20], default=0
+    )
+
+    # Density Bonus: 5 pts per unique scheduled airport (Max 15)
+    score = score + np.minimum(df['Airport_Density'], 3) * 5
+
+    # Global Gateway Bonus
+    score = score + np.where(df['iata_code'].astype(str).isin(GLOBAL_GATEWAYS), 15, 0)
+
+    # Hub Score Bonus (Native quality metric)
+    hub_lite = (
+        np.where(df['type'] == 'large_airport', 5, 0)
+        + np.where(df['name'].astype(str).str.contains('International', regex=False), 2, 0)
+    )
+    score = score + hub_lite
+
+    return score.clip(lower=10, upper=100) # Norm to 10-100 range
+
+def score_hub_legacy(df):
+    """Hub preference for picking one airport per city (type, 'international', legacy mega-hubs)"""
+    score = np.select([df['type'] == 'large_airport', df['type'] == 'medium_airport'], [100, 50], default=0)
+    score = score + np.where(df['name'].astype(str).str.lower().str.contains('international', regex=False), 30, 0)
+    score = score + np.where(df['iata_code'].astype(str).str.contains('|'.join(LEGACY_HUBS)), 500, 0)
+    return pd.Series(score, index=df.index)
+
+def fix_iata_codes(df):
+    """Stripped, upper-case IATA codes; OurAirports tags one Paris airport as LGB, which is really CDG"""
+    iata = df['iata_code'].astype(str).str.strip().str.upper()
+    paris_lgb = (
+        df['municipality'].astype(str).str.lower().str.contains('paris', regex=False)
+        & (df['iso_country'] == 'FR') & (iata == 'LGB')
+    )
+    return iata.mask(paris_lgb, 'CDG')
+
+def split_city_col(cities):
+    """"City, State, Country" -> (first, last) comma-separated parts, stripped"""
+    parts = cities.str.split(',')
+    return parts.str[0].str.strip(), parts.str[-1].str.strip()
+
+def seasonality(regions):
+    """Travel season label per region"""
+    return regions.map(REGION_SEASONALITY).fillna("Year-round")
+
+# --- V12.0: Typed Columnar Master Artifact ---
+MASTER_CSV_FILE = "master_travel_data.csv"
+MASTER_ARTIFACT_FILE = "master_travel_data.parquet"
+ARTIFACT_VERSION_KEY = b"wanderwise_version"
+CATEGORICAL_COLS = ['Region', 'Full_Country', 'iso_country', 'Seasonality']
+
+# V11.0: Country Name Cleanup Map
+COUNTRY_CLEANUP_MAP = {
+    "Korea, Republic of": "South Korea",
+    "Korea, Democratic People's Republic of": "North Korea",
+    "Russian Federation": "Russia",
+    "Iran, Islamic Republic of": "Iran",
+    "Tanzania, United Republic of": "Tanzania",
+    "Venezuela, Bolivarian Republic of": "Venezuela",
+    "Bolivia, Plurinational State of": "Bolivia",
+    "Moldova, Republic of": "Moldova",
+    "Syrian Arab Republic": "Syria",
+    "Taiwan, Province of China": "Taiwan",
+    "Lao People's Democratic Republic": "Laos",
+    "Congo, The Democratic Republic of the": "DR Congo",
+    "United States of America": "United States",
+    "United Kingdom of Great Britain and Northern Ireland": "United Kingdom",
+    "Palestine, State of": "Palestine"
+}
+
+def finalize_master(df):
+    """Load-time cleanup shared by the artifact build and the CSV fallback"""
+    # 1. Clean Country Names
+    if 'Full_Country' in df.columns:
+        df = df.assign(Full_Country=df['Full_Country'].replace(COUNTRY_CLEANUP_MAP))
+
+    # 2. Deduplicate City Cards
+    # Strategy: Keep the entry with Lowest Base Flight Cost, then Highest Popularity Score
+    # This ensures we pick main airports (e.g., CDG over LBG for Paris) which fixes broken links
+    if 'Base_Flight_Cost' in df.columns and 'Popularity_Score' in df.columns:
+        df = df.sort_values(
+            by=['Destination', 'Base_Flight_Cost', 'Popularity_Score'],
+            ascending=[True, True, False]
+        )
+
+    # Drop duplicates on 'Destination' keeping the first (Best Match)
+    return df.drop_duplicates(subset=['Destination'], keep='first').reset_index(drop=True)
+
+def dataset_version(df):
+    """Short hash of the column schema + contents, used as the app's cache key"""
+    schema = ";".join(f"{col}:{dtype}" for col, dtype in df.dtypes.astype(str).items())
+    digest = hashlib.sha256(schema.encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+def write_master_artifact(df, path=MASTER_ARTIFACT_FILE):
+    """Write the cleaned, deduplicated, categorical master table as Parquet with its version embedded"""
+    df = finalize_master(df)
+    df = df.astype({col: 'category' for col in CATEGORICAL_COLS if col in df.columns})
+    version = dataset_version(df)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), ARTIFACT_VERSION_KEY: version.encode()})
+    pq.write_table(table, path)
+    return version
+
+def read_artifact_version(path=MASTER_ARTIFACT_FILE):
+    """Read the embedded version from the Parquet footer only (no column data)"""
+    metadata = pq.read_schema(path).metadata or {}
+    return metadata.get(ARTIFACT_VERSION_KEY, b"").decode() or None
+
+def read_master_artifact(path=MASTER_ARTIFACT_FILE):
+    """Memory-mapped Parquet read; dtypes (incl. categoricals) come straight from the file"""
+    return pq.read_table(path, memory_map=True).to_pandas()
+
+def master_data_version(path=MASTER_ARTIFACT_FILE):
+    """Cache key for the master dataset: the artifact's embedded hash, or "csv" if it hasn't been built"""
+    try:
+        if os.path.exists(path):
+            return read_artifact_version(path) or "artifact"
+    except Exception:
+        pass
+    return "csv"
+
+def load_master(version):
+    """Cleaned master table for master_data_version(): typed Parquet artifact, CSV fallback"""
+    if version != "csv":
+        return read_master_artifact(MASTER_ARTIFACT_FILE)
+    # Artifact not built yet: parse the CSV and apply the same cleanup at load time
+    return finalize_master(pd.read_csv(MASTER_CSV_FILE))
+
+# --- V12.0: Raw Input Cache & Incremental Builds ---
+AIRPORTS_URL = "https://davidmegginson.github.io/ourairports-data/airports.csv"
+COL_COUNTRY_FILE = "Cost_of_Living_Index_by_Country_2024.csv"
+COL_CITY_FILE = "Cost_of_living_index_by_city.csv"
+WEATHER_FILE = "avg_temp_cities.csv"
+CACHE_DIR = os.environ.get("WANDERWISE_CACHE_DIR", ".wanderwise_cache")
+OFFLINE = os.environ.get("WANDERWISE_OFFLINE", "").lower() in ("1", "true", "yes")
+BUILD_MANIFEST = "build_manifest.json"
+SOURCES_INDEX = "sources.json"
+BUILD_CODE_FILES = ["data_prep.py", "distance.py"]  # Modules whose code shapes the build outputs
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def build_code_version():
+    """Hash of the build code itself, so upgrading data_prep invalidates old outputs and cached stages"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    return hashlib.sha256(
+        "".join(file_sha256(os.path.join(here, name)) for name in BUILD_CODE_FILES).encode()
+    ).hexdigest()[:16]
+
+def _load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+def cache_raw_input(path, cache_dir=CACHE_DIR, move=False):
+    """Store a raw input under objects/<sha256>.csv and return the cached path"""
+    objects_dir = os.path.join(cache_dir, "objects")
+    os.makedirs(objects_dir, exist_ok=True)
+    cached = os.path.join(objects_dir, f"{file_sha256(path)}.csv")
+    if os.path.exists(cached):
+        if move: os.remove(path)
+    elif move:
+        shutil.move(path, cached)
+    else:
+        shutil.copyfile(path, cached)
+    return cached
+
+def fetch_airports(source=AIRPORTS_URL, cache_dir=CACHE_DIR, offline=OFFLINE):
+    """Local, content-addressed copy of the OurAirports CSV.
+
+    source may be a URL or a local file. Online builds download and cache it; offline builds (or
+    failed downloads) fall back to the last cached copy for that source.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, SOURCES_INDEX)
+    index = _load_json(index_path)
+
+    if os.path.exists(source):
+        cached = cache_raw_input(source, cache_dir)
+    elif not offline:
+        try:
+            tmp_path = os.path.join(cache_dir, "airports.download")
+            urllib.request.urlretrieve(source, tmp_path)
+            cached = cache_raw_input(tmp_path, cache_dir, move=True)
+            print(f"🌐 Downloaded {source}")
+        except OSError as e:
+            print(f"⚠️ Download failed ({e}), trying the local cache...")
+            cached = None
+    else:
+        cached = None
+
+    if cached is None:
+        cached = os.path.join(cache_dir, "objects", f"{index.get(source, '')}.csv")
+        if source not in index or not os.path.exists(cached):
+            raise RuntimeError(f"No cached copy of {source} in {cache_dir}. Run once online or pass a local file.")
+        print(f"📦 Using cached airports data ({index[source][:12]})")
+
+    index[source] = os.path.basename(cached)[:-len(".csv")]
+    _save_json(index_path, index)
+    return cached
+
+# --- V12.0: Streaming Ingestion ---
+# The unfiltered OurAirports file (and any other large raw table) is read in fixed-size chunks with only
+# the columns the build uses and explicit dtypes, and each chunk is filtered before it is kept, so peak
+# memory follows the filtered size rather than the raw file size.
+INGEST_CHUNK_ROWS = int(os.environ.get("WANDERWISE_CHUNK_ROWS", 100_000))
+
+AIRPORT_DTYPES = {
+    'type': str, 'name': str, 'latitude_deg': 'float64', 'longitude_deg': 'float64',
+    'iso_country': str, 'municipality': str, 'scheduled_service': str, 'iata_code': str,
+}
+
+def scheduled_airport_mask(df):
+    """Large airports, plus medium 'International' ones, with scheduled service and an IATA code"""
+    return (
+        (df['type'] == 'large_airport') | 
+        ((df['type'] == 'medium_airport') & df['name'].str.contains('International', na=False))
+    ) & (df['scheduled_service'] == 'yes') & (df['iata_code'].notna())
+
+def iter_csv_chunks(path, dtypes, row_filter=None, chunksize=INGEST_CHUNK_ROWS, stats=None):
+    """Yield the dtypes columns of a CSV chunk by chunk, keeping the rows row_filter accepts"""
+    for chunk in pd.read_csv(path, usecols=list(dtypes), dtype=dtypes, chunksize=chunksize):
+        if stats is not None:
+            stats['rows'] += len(chunk)
+        yield chunk[row_filter(chunk)] if row_filter is not None else chunk
+
+def stream_csv(path, dtypes, row_filter=None, chunksize=INGEST_CHUNK_ROWS, stats=None):
+    """iter_csv_chunks collected into one frame"""
+    kept = list(iter_csv_chunks(path, dtypes, row_filter, chunksize, stats))
+    if not kept:
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in dtypes.items()})
+    return pd.concat(kept, ignore_index=True)
+
+def read_airports(path, chunksize=INGEST_CHUNK_ROWS, stats=None):
+    """Scheduled airports from the raw OurAirports CSV, filtered while streaming"""
+    return stream_csv(path, AIRPORT_DTYPES, scheduled_airport_mask, chunksize, stats)
+
+# --- V12.0: DOT Fare Index ---
+# Consumer Airfare Report tables (one per year/quarter) list an average fare per airport pair. They
+# are reduced chunk by chunk to one mean fare per unordered airport pair and per unordered city market
+# pair, then compiled into a small symmetric matrix over the master airports the tables cover.
+FARE_FILES = ["Consumer_Airfare_Report__Table_1a_-_All_U.S._Airport_Pair_Markets.csv"]
+
+FARE_DTYPES = {
+    'citymarketid_1': 'int64', 'citymarketid_2': 'int64',
+    'airport_1': str, 'airport_2': str, 'fare': 'float64',
+}
+
+def valid_fare_mask(df):
+    return df['airport_1'].notna() & df['airport_2'].notna() & (df['fare'] > 0)
+
+def _pair_fare_sums(a, b, fare):
+    """Fare sum/count per unordered (a, b) pair, so (ABQ, DFW) and (DFW, ABQ) share one entry"""
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    return pd.DataFrame({'a': lo, 'b': hi, 'fare': fare}).groupby(['a', 'b'])['fare'].agg(['sum', 'count'])
+
+def _add_fare_sums(totals, part):
+    """Fold one chunk's pair sums into the running totals (memory bounded by distinct pairs, not rows)"""
+    return part if totals is None else totals.add(part, fill_value=0)
+
+def _add_airport_markets(known, a, b, market_a, market_b):
+    """Extend the airport -> city market map with airports not seen in earlier chunks (first seen wins)"""
+    chunk = pd.Series(np.concatenate([market_a, market_b]), index=np.concatenate([a, b]))
+    chunk = chunk[~chunk.index.duplicated(keep='first')]
+    if known is None:
+        return chunk
+    return pd.concat([known, chunk[~chunk.index.isin(known.index)]])
+
+def compile_fare_index(paths, iata_codes, chunksize=INGEST_CHUNK_ROWS, stats=None):
+    """(covered IATA codes, symmetric fare matrix) for iata_codes; NaN where no fare is known.
+
+    Airport-pair fares win; pairs the tables only cover at city-market level (e.g. AUS-EWR when
+    only AUS-LGA is listed) fall back to the market-pair average.
+    """
+    if stats is None:
+        stats = {'rows': 0}
+    airport_totals = market_totals = airport_markets = None
+    for path in paths:
+        for chunk in iter_csv_chunks(path, FARE_DTYPES, valid_fare_mask, chunksize, stats):
+            a1 = chunk['airport_1'].str.strip().str.upper().to_numpy()
+            a2 = chunk['airport_2'].str.strip().str.upper().to_numpy()
+            m1, m2, fare = chunk['citymarketid_1'].to_numpy(), chunk['citymarketid_2'].to_numpy(), chunk['fare'].to_numpy()
+            airport_totals = _add_fare_sums(airport_totals, _pair_fare_sums(a1, a2, fare))
+            market_totals = _add_fare_sums(market_totals, _pair_fare_sums(m1, m2, fare))
+            airport_markets = _add_airport_markets(airport_markets, a1, a2, m1, m2)
+    if airport_totals is None:
+        return np.array([], dtype=str), np.empty((0, 0), dtype=np.float32)
+
+    airport_fares = airport_totals['sum'] / airport_totals['count']
+    market_fares = market_totals['sum'] / market_totals['count']
+
+    # Only master airports the fare tables know about get a row
+    iata_codes = pd.Index(pd.unique(np.asarray(iata_codes, dtype=str)))
+    covered = iata_codes[iata_codes.isin(airport_markets.index)]
+    n = len(covered)
+
+    # Market fallback first: gather a (markets x markets) table through each airport's market
+    markets = airport_markets.reindex(covered).to_numpy()
+    market_index = pd.Index(pd.unique(markets))
+    market_pos = market_index.get_indexer(markets)
+    market_table = np.full((len(market_index), len(market_index)), np.nan)
+    mi = market_index.get_indexer(market_fares.index.get_level_values(0))
+    mj = market_index.get_indexer(market_fares.index.get_level_values(1))
+    known = (mi >= 0) & (mj >= 0)
+    market_table[mi[known], mj[known]] = market_fares.to_numpy()[known]
+    market_table[mj[known], mi[known]] = market_fares.to_numpy()[known]
+    fares = market_table[market_pos[:, None], market_pos[None, :]]
+
+    # Then the exact airport pairs on top
+    ai = covered.get_indexer(airport_fares.index.get_level_values(0))
+    aj = covered.get_indexer(airport_fares.index.get_level_values(1))
+    known = (ai >= 0) & (aj >= 0)
+    fares[ai[known], aj[known]] = airport_fares.to_numpy()[known]
+    fares[aj[known], ai[known]] = airport_fares.to_numpy()[known]
+    np.fill_diagonal(fares, np.nan)
+    return covered.to_numpy(dtype=str), fares.astype(np.float32)
+
+def fare_index_for(iata_codes):
+    """The compiled fare lookup, else one compiled from FARE_FILES in memory; None means distance model only"""
+    fares = load_fare_index()
+    if fares is not None:
+        return fares
+    try:
+        return FareIndex(*compile_fare_index(FARE_FILES, iata_codes))
+    except (OSError, ValueError, KeyError) as e:  # Missing or malformed fare table; code bugs still surface
+        logger.warning("Fare table unavailable (%s: %s); pricing with the distance model only", type(e).__name__, e)
+        return None
+
+# --- V12.0: Stage Metrics ---
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None without the resource module)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024  # bytes on macOS, KB on Linux
+
+@contextmanager
+def build_stage(name, report):
+    """Time a build stage; the stage sets stats['rows'] to the number of input rows it processed"""
+    stats = {'rows': 0}
+    start = time.perf_counter()
+    yield stats
+    elapsed = time.perf_counter() - start
+    report.append({'stage': name, 'rows': stats['rows'], 'seconds': elapsed, 'peak_rss_mb': peak_rss_mb()})
+
+def print_stage_report(report):
+    for r in report:
+        rate = r['rows'] / r['seconds'] if r['seconds'] > 0 else float('inf')
+        rss = f"{r['peak_rss_mb']:.0f} MB" if r['peak_rss_mb'] is not None else "n/a"
+        print(f"⏱️ {r['stage']:<16} {r['rows']:>10,} rows  {r['seconds']:7.2f}s  {rate:>12,.0f} rows/s  peak RSS {rss}")
+
+# --- Build Stages ---
+def load_country_col():
+    """Country-level cost of living, keyed by ISO code"""
+    df_col_country = pd.read_csv(COL_COUNTRY_FILE)
     df_col_country.columns = df_col_country.columns.str.strip()
-    df_col_city = pd.read_csv("Cost_of_living_index_by_city.csv")
-    df_col_city.columns = df_col_city.columns.str.strip()
-    df_weather = pd.read_csv("avg_temp_cities.csv")
-    
-    # 2. Process Airports (Atomic V5.22 Logic)
-    mask = (
-        (df_airports['type'] == 'large_airport') | 
-        ((df_airports['type'] == 'medium_airport') & df_airports['name'].str.contains('International', na=False))
-    ) & (df_airports['scheduled_service'] == 'yes') & (df_airports['iata_code'].notna())
-    df_airports = df_airports[mask].copy()
+    name_to_iso = create_name_to_iso_map()
+    df_col_country['iso_country'] = df_col_country['Country'].map(name_to_iso)
+    return df_col_country.drop_duplicates(subset=['iso_country'], keep='first')
+
+def build_airports(df_airports):
+    """Scheduled international airports, one row per IATA code, with hub density"""
+    # 2. Process Airports (Atomic V5.22 Logic); a no-op filter when read_airports already applied it
+    df_airports = df_airports[scheduled_airport_mask(df_airports)].copy()
     
-    def fix_iata(row):
-        iata = str(row['iata_code']).strip().upper()
-        city = str(row['municipality']).lower()
-        if 'paris' in city and row['iso_country'] == 'FR' and iata == 'LGB': return 'CDG'
-        return iata
-    df_airports['iata_code'] = df_airports.apply(fix_iata, axis=1)
+    df_airports['iata_code'] = fix_iata_codes(df_airports)
     df_airports = df_airports[~((df_airports['iata_code'] == 'LGB') & (df_airports['iso_country'] != 'US'))]
     
     df_airports = df_airports.sort_values(by='type', ascending=True)
@@ -134,26 +550,14 @@ def run_data_prep():
     
     # --- V9.0: CALCULATE HUB DENSITY (Unique scheduled airports per city) ---
     city_counts = df_airports.groupby(['municipality', 'iso_country']).size().reset_index(name='Airport_Density')
-    df_airports = df_airports.merge(city_counts, on=['municipality', 'iso_country'], how='left')
+    return df_airports.merge(city_counts, on=['municipality', 'iso_country'], how='left')
 
+def merge_cost_of_living(df_airports, df_col_country, df_col_city):
+    """Attach country COL indexes, overridden by city-level ones where the city matches"""
     # 3. Process City COL Metadata for Merge
-    def parse_city_col(row):
-        parts = [p.strip() for p in row['City'].split(',')]
-        return parts[0], parts[-1]
-    df_col_city[['Match_City', 'Match_Country']] = df_col_city.apply(
-        lambda r: pd.Series(parse_city_col(r)), axis=1
-    )
-    
-    # 4. Process Weather Metadata for Merge
-    months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    for m in months:
-        df_weather[m] = df_weather[m].apply(clean_temp)
+    df_col_city['Match_City'], df_col_city['Match_Country'] = split_city_col(df_col_city['City'])
     
     # 5. MERGE PIPELINE
-    name_to_iso = create_name_to_iso_map()
-    df_col_country['iso_country'] = df_col_country['Country'].map(name_to_iso)
-    df_col_country = df_col_country.drop_duplicates(subset=['iso_country'], keep='first')
-    
     master = df_airports.merge(
         df_col_country[['iso_country', 'Cost of Living Index', 'Rent Index', 'Restaurant Price Index']],
         on='iso_country', how='left'
@@ -167,61 +571,33 @@ def run_data_prep():
     
     for col in ['Cost of Living Index', 'Rent Index', 'Restaurant Price Index']:
         city_master[col] = city_master[col + '_City'].fillna(city_master[col])
-    
+    return city_master
+
+def merge_weather(city_master, weather):
+    """Monthly temperatures by city, falling back to the country average (weather is a WeatherTable)"""
     weather_master = city_master.merge(
-        df_weather[['City', 'Country'] + months],
+        weather.frame(),
         left_on=['Clean_City', 'Full_Country'], right_on=['City', 'Country'],
         how='left', suffixes=('', '_W')
     )
     
-    country_weather_avg = df_weather.groupby('Country')[months].mean().reset_index()
     weather_master = weather_master.merge(
-        country_weather_avg, left_on='Full_Country', right_on='Country',
+        weather.country_avg, left_on='Full_Country', right_on='Country',
         how='left', suffixes=('', '_C_Avg')
     )
-    for m in months:
+    for m in MONTHS:
         weather_master[m] = weather_master[m].fillna(weather_master[m + '_C_Avg'])
-    
+    return weather_master
+
+def score_destinations(weather_master, df_col_country):
+    """Popularity, per-city dedupe and daily cost pre-calculations; returns the save-ready frame"""
     # 6. INTELLIGENT POPULARITY ENGINE (V9.0)
-    def calculate_popularity(row):
-        score = 0
-        country_score = COUNTRY_POPULARITY.get(row['Full_Country'], 10)
-        score += country_score * 0.3 # Base (Max 30)
-        
-        city_name = str(row['Clean_City'])
-        if city_name in TIER_1_ANCHORS: score += 40
-        elif city_name in TIER_2_ANCHORS: score += 20
-        
-        # Density Bonus: 5 pts per unique scheduled airport (Max 15)
-        density = min(row['Airport_Density'], 3)
-        score += density * 5
-        
-        # Global Gateway Bonus
-        if str(row['iata_code']) in GLOBAL_GATEWAYS: score += 15
-        
-        # Hub Score Bonus (Native quality metric)
-        def score_hub_lite(r):
-            s = 0
-            if r['type'] == 'large_airport': s += 5
-            if 'International' in str(r['name']): s += 2
-            return s
-        score += score_hub_lite(row)
-        
-        return min(max(score, 10), 100) # Norm to 10-100 range
-
-    weather_master['Popularity_Score'] = weather_master.apply(calculate_popularity, axis=1)
+    # V12.0: Column-wise; terms are added in the original order so float results match exactly
+    weather_master['Popularity_Score'] = calculate_popularity(weather_master)
     
     # Second Pass: Deduplication
     # Prioritize hub score/type for selection within same city
-    def score_hub_legacy(row):
-        score = 0
-        if row['type'] == 'large_airport': score += 100
-        elif row['type'] == 'medium_airport': score += 50
-        if 'international' in str(row['name']).lower(): score += 30
-        if any(hub in str(row['iata_code']) for hub in ['CDG', 'LHR', 'HND', 'JFK']): score += 500
-        return score
-    
-    weather_master['Legacy_Hub_Score'] = weather_master.apply(score_hub_legacy, axis=1)
+    weather_master['Legacy_Hub_Score'] = score_hub_legacy(weather_master)
     weather_master = weather_master.sort_values(by=['municipality', 'iso_country', 'Legacy_Hub_Score'], ascending=[True, True, False])
     final = weather_master.drop_duplicates(subset=['municipality', 'iso_country'], keep='first').reset_index(drop=True)
 
@@ -237,15 +613,9 @@ def run_data_prep():
     final['Region'] = final['iso_country'].map(ISO_TO_REGION).fillna('Other')
     final['Base_Flight_Cost'] = final['Region'].map(REGION_FLIGHT_COSTS).fillna(800)
     
-    def get_seasonality(row):
-        region = row['Region']
-        if region == 'Europe': return "Summer Peak (Jun-Aug)"
-        if region == 'Asia': return "Varies (Nov-Mar ideal)"
-        if region == 'Oceania': return "Winter Peak (Dec-Feb)"
-        return "Year-round"
-    final['Seasonality'] = final.apply(get_seasonality, axis=1)
-
-    # 8. CLEANUP & SAVE
+    final['Seasonality'] = seasonality(final['Region'])
+
+    # 8. CLEANUP
     final['Destination'] = final['Clean_City'] + ", " + final['iso_country']
     final['Search_Term'] = final['Clean_City'] + ", " + final['Full_Country']
     
@@ -253,13 +623,101 @@ def run_data_prep():
         'Destination', 'IATA', 'Search_Term', 'Full_Country', 'iso_country', 'Region', 
         'Base_Flight_Cost', 'Daily_Cost_Budget', 'Daily_Cost_Luxury', 'Seasonality',
         'latitude_deg', 'longitude_deg', 'Popularity_Score'
-    ] + months
+    ] + MONTHS
     
     final = final.rename(columns={'iata_code': 'IATA'})
+    return final[cols_to_save]
+
+def build_outputs_exist():
+    outputs = [
+        MASTER_CSV_FILE, MASTER_ARTIFACT_FILE, DISTANCE_MATRIX_FILE, FLIGHT_BASE_MATRIX_FILE, MATRIX_INDEX_FILE,
+        FARE_MATRIX_FILE, FARE_INDEX_FILE,
+    ]
+    return all(os.path.exists(p) for p in outputs)
+
+def run_data_prep(airports_source=AIRPORTS_URL, cache_dir=CACHE_DIR, offline=OFFLINE, force=False,
+                  chunksize=INGEST_CHUNK_ROWS, fare_files=FARE_FILES):
+    print("🚀 Starting WanderWise V9.0 Build-Time Data Engine...")
+    report = []
     
+    # 1. Resolve All 4 Raw Inputs (airports via the local content-addressed cache)
+    inputs = {
+        'airports': fetch_airports(airports_source, cache_dir, offline),
+        'col_country': COL_COUNTRY_FILE,
+        'col_city': COL_CITY_FILE,
+        'weather': WEATHER_FILE,
+    }
+    inputs.update({f"fares:{os.path.basename(path)}": path for path in fare_files})
+    input_hashes = {name: file_sha256(path) for name, path in inputs.items()}
+    code_version = build_code_version()
+
+    # V12.0: Incremental build - nothing changed (inputs or build code) means nothing to do
+    manifest_path = os.path.join(cache_dir, BUILD_MANIFEST)
+    manifest = _load_json(manifest_path)
+    if (not force and manifest.get('inputs') == input_hashes and manifest.get('code') == code_version
+            and build_outputs_exist()):
+        print("✅ Inputs and build code unchanged since the last build, skipping rebuild.")
+        return
+
+    # Airports + cost-of-living stage only depends on 3 of the 4 inputs; reuse it on weather-only changes
+    stage_key = hashlib.sha256(
+        "".join([code_version] + [input_hashes[k] for k in ('airports', 'col_country', 'col_city')]).encode()
+    ).hexdigest()[:16]
+    stage_path = os.path.join(cache_dir, "stages", f"city_master-{stage_key}.pkl")
+    if os.path.exists(stage_path) and not force:
+        print("♻️ Airports & cost-of-living inputs unchanged, reusing cached stage.")
+        city_master = pd.read_pickle(stage_path)
+    else:
+        with build_stage("airports", report) as stats:
+            df_airports = build_airports(read_airports(inputs['airports'], chunksize, stats))
+        with build_stage("cost_of_living", report) as stats:
+            df_col_city = pd.read_csv(COL_CITY_FILE)
+            df_col_city.columns = df_col_city.columns.str.strip()
+            city_master = merge_cost_of_living(df_airports, load_country_col(), df_col_city)
+            stats['rows'] = len(df_airports) + len(df_col_city)
+        os.makedirs(os.path.dirname(stage_path), exist_ok=True)
+        city_master.to_pickle(stage_path)
+
+    with build_stage("weather", report) as stats:
+        weather = load_weather(WEATHER_FILE, dtype=np.float64)
+        weather_master = merge_weather(city_master, weather)
+        stats['rows'] = len(city_master) + len(weather.keys)
+    with build_stage("scoring", report) as stats:
+        final = score_destinations(weather_master, load_country_col())
+        stats['rows'] = len(weather_master)
+
+    # 9. SAVE
     print(f"✅ Generated {len(final)} unique destinations.")
-    final[cols_to_save].to_csv("master_travel_data.csv", index=False)
-    print("📁 Master dataset saved to master_travel_data.csv")
+    with build_stage("save", report) as stats:
+        final.to_csv(MASTER_CSV_FILE, index=False)
+        print(f"📁 Master dataset saved to {MASTER_CSV_FILE}")
+
+        version = write_master_artifact(final)
+        print(f"📦 Typed artifact saved to {MASTER_ARTIFACT_FILE} (version {version})")
+        stats['rows'] = len(final)
+
+    # 10. V12.0: ALL-PAIRS DISTANCE & FLIGHT BASE MATRICES (same row order as the CSV)
+    with build_stage("travel_matrices", report) as stats:
+        shape = save_travel_matrices(final['IATA'], final['latitude_deg'], final['longitude_deg'])
+        print(f"📐 Saved {shape[0]}x{shape[1]} distance & flight base matrices (float32 .npy)")
+        stats['rows'] = shape[0] * shape[1]
+
+    # 11. V12.0: DOT FARE INDEX (real airport-pair fares; the distance model covers everything else)
+    with build_stage("fares", report) as stats:
+        fare_iata, fares = compile_fare_index(fare_files, final['IATA'], chunksize, stats)
+        save_fare_index(fare_iata, fares)
+        print(f"💵 Compiled fares for {len(fare_iata)} airports ({int(np.isfinite(fares).sum()) // 2} pairs)")
+
+    _save_json(manifest_path, {'inputs': input_hashes, 'code': code_version, 'version': version})
+    print_stage_report(report)
 
 if __name__ == "__main__":
-    run_data_prep()
+    parser = argparse.ArgumentParser(description="Build the WanderWise master dataset")
+    parser.add_argument("--airports", default=AIRPORTS_URL, help="OurAirports CSV URL or local path")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Raw input / stage cache directory")
+    parser.add_argument("--offline", action="store_true", default=OFFLINE, help="Never hit the network")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if no input changed")
+    parser.add_argument("--chunksize", type=int, default=INGEST_CHUNK_ROWS, help="Rows per chunk when streaming raw inputs")
+    parser.add_argument("--fares", nargs="*", default=FARE_FILES, help="DOT Consumer Airfare Report CSVs")
+    args = parser.parse_args()
+    run_data_prep(args.airports, args.cache_dir, args.offline, args.force, args.chunksize, args.fares)
@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371
+
+# Variable flight cost: $150 base + $0.08 per km
+FLIGHT_BASE_FARE = 150
+FLIGHT_COST_PER_KM = 0.08
+
+# V12.0: Build-time all-pairs matrices (written by data_prep.py, rows/cols in master_travel_data.csv order)
+DISTANCE_MATRIX_FILE = "distance_matrix.npy"
+FLIGHT_BASE_MATRIX_FILE = "flight_base_matrix.npy"
+MATRIX_INDEX_FILE = "matrix_iata.npy"
+
+# V12.0: Compiled DOT airport-pair fares (written by data_prep.py, only airports the fare tables cover)
+FARE_MATRIX_FILE = "fare_matrix.npy"
+FARE_INDEX_FILE = "fare_iata.npy"
+
+
+def haversine_km(lat1, lon1, lat2, lon2, dtype=np.float64):
+    """V12.0: Vectorized great-circle distance in km.
+
+    Inputs broadcast against each other like any NumPy expression, so one origin
+    against all destinations, or an (N, 1) column of origins against M
+    destinations, is a single array operation. Pairs with a missing coordinate
+    come back as 0, matching the old per-row pd.isna guard.
+    """
+    lat1, lon1, lat2, lon2 = (np.asarray(x, dtype=np.float64) for x in (lat1, lon1, lat2, lon2))
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dlat = phi2 - phi1
+    dlon = np.radians(lon2 - lon1)
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlon / 2) ** 2
+    # Rounding can push a a hair past 1.0 for antipodal points
+    dist = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    dist = np.where(np.isnan(dist), 0.0, dist)
+    return dist.astype(dtype, copy=False)
+
+
+def distances_from(o_lat, o_lon, lats, lons, dtype=np.float64):
+    """Distance from a single origin to every destination (1-D result)"""
+    return haversine_km(o_lat, o_lon, lats, lons, dtype=dtype)
+
+
+def pairwise_distances(lats_a, lons_a, lats_b=None, lons_b=None, dtype=np.float32):
+    """N origins x M destinations distance matrix (all-pairs when b is omitted)"""
+    lats_a = np.asarray(lats_a, dtype=np.float64)
+    lons_a = np.asarray(lons_a, dtype=np.float64)
+    if lats_b is None:
+        lats_b, lons_b = lats_a, lons_a
+    return haversine_km(
+        lats_a[:, None], lons_a[:, None],
+        np.asarray(lats_b, dtype=np.float64)[None, :], np.asarray(lons_b, dtype=np.float64)[None, :],
+        dtype=dtype,
+    )
+
+
+def flight_base_cost(distance_km):
+    """Per-traveler base airfare for a distance (before class multiplier)"""
+    return FLIGHT_BASE_FARE + (distance_km * FLIGHT_COST_PER_KM)
+
+
+def save_travel_matrices(iata_codes, lats, lons, out_dir="."):
+    """Write float32 distance / flight-base matrices plus their IATA index as .npy files"""
+    distance = pairwise_distances(lats, lons, dtype=np.float32)
+    flight_base = flight_base_cost(distance).astype(np.float32, copy=False)
+    np.save(os.path.join(out_dir, DISTANCE_MATRIX_FILE), distance)
+    np.save(os.path.join(out_dir, FLIGHT_BASE_MATRIX_FILE), flight_base)
+    np.save(os.path.join(out_dir, MATRIX_INDEX_FILE), np.asarray(iata_codes, dtype=str))
+    return distance.shape
+
+
+class TravelMatrices:
+    """Memory-mapped origin x destination lookup. Only the rows actually read are paged in."""
+
+    def __init__(self, iata_codes, distance, flight_base, data_dir="."):
+        self.index = pd.Index(iata_codes)
+        self.distance = distance
+        self.flight_base = flight_base
+        self.data_dir = data_dir  # Lets worker processes re-open the same files instead of pickling them
+
+    def positions(self, iata_codes):
+        """Matrix positions for the given IATA codes (-1 where unknown)"""
+        return self.index.get_indexer(pd.Index(iata_codes))
+
+    def origin_rows(self, origin_iata, dest_positions):
+        """(Distance_KM, Calculated_Flight_Base) for one origin against dest_positions, or None"""
+        if origin_iata not in self.index or (dest_positions < 0).any():
+            return None
+        row = self.index.get_loc(origin_iata)
+        # Gather before widening, so a handful of destinations only touches a handful of cells
+        return (
+            np.asarray(self.distance[row][dest_positions], dtype=np.float64),
+            np.asarray(self.flight_base[row][dest_positions], dtype=np.float64),
+        )
+
+
+def load_travel_matrices(data_dir="."):
+    """Open the precomputed matrices lazily via mmap. Returns None if they have not been built."""
+    paths = [os.path.join(data_dir, f) for f in (MATRIX_INDEX_FILE, DISTANCE_MATRIX_FILE, FLIGHT_BASE_MATRIX_FILE)]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    iata_codes = np.load(paths[0])
+    distance = np.load(paths[1], mmap_mode="r")
+    flight_base = np.load(paths[2], mmap_mode="r")
+    if distance.shape != (len(iata_codes), len(iata_codes)) or flight_base.shape != distance.shape:
+        return None
+    return TravelMatrices(iata_codes, distance, flight_base, data_dir)
+
+
+class FareIndex:
+    """Symmetric airport-pair fare lookup. One origin row is a single gather over all destinations."""
+
+    def __init__(self, iata_codes, fares, data_dir="."):
+        self.index = pd.Index(iata_codes)
+        self.fares = fares  # (K, K) float32, NaN where no fare is known
+        self.data_dir = data_dir
+
+    def positions(self, iata_codes):
+        """Fare matrix positions for the given IATA codes (-1 where the fare tables don't cover them)"""
+        return self.index.get_indexer(pd.Index(iata_codes))
+
+    def origin_fares(self, origin_iata, dest_positions):
+        """Per-traveler fares from origin_iata to dest_positions (NaN where missing), or None"""
+        if origin_iata not in self.index:
+            return None
+        row = self.fares[self.index.get_loc(origin_iata)]
+        return np.where(dest_positions >= 0, np.asarray(row[dest_positions], dtype=np.float64), np.nan)
+
+
+def save_fare_index(iata_codes, fares, out_dir="."):
+    np.save(os.path.join(out_dir, FARE_MATRIX_FILE), np.asarray(fares, dtype=np.float32))
+    np.save(os.path.join(out_dir, FARE_INDEX_FILE), np.asarray(iata_codes, dtype=str))
+
+
+def load_fare_index(data_dir="."):
+    """Open the compiled fare lookup via mmap. Returns None if it has not been built."""
+    paths = [os.path.join(data_dir, f) for f in (FARE_INDEX_FILE, FARE_MATRIX_FILE)]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    iata_codes = np.load(paths[0])
+    fares = np.load(paths[1], mmap_mode="r")
+    if fares.shape != (len(iata_codes), len(iata_codes)):
+        return None
+    return FareIndex(iata_codes, fares, data_dir)
+
+
+def apply_fares(flight_base, fares, origin_iata, fare_positions):
+    """Known airport-pair fares replace the distance model; every other pair keeps flight_base.
+
+    fare_positions is fares.positions(<destination IATA codes>), computed once per destination set.
+    """
+    if fares is None:
+        return flight_base
+    origin_fares = fares.origin_fares(origin_iata, fare_positions)
+    if origin_fares is None:
+        return flight_base
+    return np.where(np.isnan(origin_fares), flight_base, origin_fares)
@@ -0,0 +1,290 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- V12.0: Rerun Instrumentation ---
+# Named stage timers and row counters for one app rerun or API request, reported as one JSON log
+# line per run and accumulated into Prometheus-style counters. Everything is off unless enabled via
+# the environment; disabled, stage() is a flag check returning a shared no-op context manager.
+#
+#   WANDERWISE_METRICS=1                 stage timings, log lines and counters
+#   WANDERWISE_METRICS_PORT=9464         also serve /metrics from the app process (implies METRICS)
+#   WANDERWISE_PROFILE=cprofile          profile every run (or "pyinstrument" if it is installed)
+#   WANDERWISE_PROFILE_DIR=profiles      where profiles are written
+
+PROFILER = os.environ.get("WANDERWISE_PROFILE", "").strip().lower()
+PROFILE_DIR = os.environ.get("WANDERWISE_PROFILE_DIR", "profiles")
+METRICS_PORT = int(os.environ.get("WANDERWISE_METRICS_PORT", "0") or 0)
+ENABLED = os.environ.get("WANDERWISE_METRICS", "").strip() not in ("", "0") or bool(PROFILER) or bool(METRICS_PORT)
+
+RUN_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger("wanderwise.metrics")
+if ENABLED and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current_run = contextvars.ContextVar("wanderwise_run", default=None)
+
+
+class MetricsRegistry:
+    """Process-wide cumulative counters plus a run-duration histogram, rendered as Prometheus text"""
+
+    def __init__(self):
+        self._counters = {}   # (metric, sorted label items) -> value
+        self._runs = {}       # run name -> [bucket counts..., +Inf count, seconds sum]
+        self._lock = threading.Lock()
+
+    def inc(self, metric, value=1, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe_run(self, run):
+        with self._lock:
+            hist = self._runs.setdefault(run.name, [0] * (len(RUN_SECONDS_BUCKETS) + 2))
+            for i, bound in enumerate(RUN_SECONDS_BUCKETS):
+                if run.seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += 1
+            hist[-1] += run.seconds
+            for name, (seconds, calls, rows) in run.stages.items():
+                for metric, value in (("wanderwise_stage_seconds_total", seconds),
+                                      ("wanderwise_stage_calls_total", calls),
+                                      ("wanderwise_stage_rows_total", rows)):
+                    key = (metric, (("run", run.name), ("stage", name)))
+                    self._counters[key] = self._counters.get(key, 0) + value
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            seen = set()
+            for (metric, labels), value in sorted(self._counters.items()):
+                if metric not in seen:
+                    seen.add(metric)
+                    lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric}{_labels(labels)} {_value(value)}")
+            if self._runs:
+                lines.append("# TYPE wanderwise_run_seconds histogram")
+            for name, hist in sorted(self._runs.items()):
+                for bound, count in zip(RUN_SECONDS_BUCKETS, hist):
+                    lines.append(f'wanderwise_run_seconds_bucket{_labels((("run", name), ("le", f"{bound:g}")))} {count}')
+                lines.append(f'wanderwise_run_seconds_bucket{_labels((("run", name), ("le", "+Inf")))} {hist[-2]}')
+                lines.append(f'wanderwise_run_seconds_count{_labels((("run", name),))} {hist[-2]}')
+                lines.append(f'wanderwise_run_seconds_sum{_labels((("run", name),))} {_value(hist[-1])}')
+        return "\n".join(lines) + "\n"
+
+
+def _value(value):
+    """Exact sample value: counters keep growing, so never round them to a few significant digits"""
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def _labels(items):
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _NullStage:
+    """Shared no-op stand-in for _Stage while instrumentation is off"""
+    rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("run", "name", "rows", "start")
+
+    def __init__(self, run, name, rows):
+        self.run, self.name, self.rows = run, name, rows
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.run.record(self.name, time.perf_counter() - self.start, self.rows)
+        return False
+
+
+class Run:
+    """Stage timings and row counts for one rerun or request"""
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+        self.stages = {}   # stage -> [seconds, calls, rows], in first-seen order
+        self.seconds = 0.0
+        self._profiler = _start_profiler()
+        _current_run.set(self)
+        self._start = time.perf_counter()
+
+    def stage(self, name, rows=0):
+        """Context manager timing one named stage; set .rows on it (or pass rows) to count rows"""
+        return _Stage(self, name, rows)
+
+    def annotate(self, **fields):
+        """Add fields to the run's log line"""
+        self.fields.update(fields)
+
+    def record(self, name, seconds, rows=0):
+        entry = self.stages.setdefault(name, [0.0, 0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+        entry[2] += int(rows or 0)
+
+    def finish(self, **fields):
+        """Close the run: one structured log line, registry update, profile written if enabled"""
+        self.seconds = time.perf_counter() - self._start
+        _current_run.set(None)
+        profile_path = _stop_profiler(self._profiler, self.name)
+        REGISTRY.observe_run(self)
+        line = {"event": "run", "run": self.name, **self.fields, **fields, "total_ms": round(self.seconds * 1000, 3),
+                "stages": {name: {"ms": round(s * 1000, 3), "calls": c, "rows": r}
+                           for name, (s, c, r) in self.stages.items()}}
+        if profile_path:
+            line["profile"] = profile_path
+        logger.info(json.dumps(line, default=str))
+
+
+class _NullRun:
+    """What start_run returns while instrumentation is off"""
+
+    def stage(self, name, rows=0):
+        return NULL_STAGE
+
+    def annotate(self, **fields):
+        pass
+
+    def record(self, name, seconds, rows=0):
+        pass
+
+    def finish(self, **fields):
+        pass
+
+
+NULL_RUN = _NullRun()
+
+
+def start_run(name, **fields):
+    """Begin a run; stage() calls anywhere in this thread/task are attributed to it until finish()"""
+    return Run(name, **fields) if ENABLED else NULL_RUN
+
+
+def stage(name, rows=0):
+    """Time a named stage of the current run (a no-op outside a run or when disabled)"""
+    if not ENABLED:
+        return NULL_STAGE
+    run = _current_run.get()
+    return NULL_STAGE if run is None else _Stage(run, name, rows)
+
+
+# --- Profiling ---
+
+_profile_seq = 0
+_profile_lock = threading.Lock()
+# Only one profiler may be active per process (Python 3.12+ raises on a second cProfile enable()),
+# so concurrent runs (API worker threads) are profiled one at a time; the others just skip it.
+_profiler_busy = threading.Lock()
+
+
+def _new_profiler():
+    if PROFILER == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            return None  # Optional dependency; timings and counters still work
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    return None
+
+
+def _start_profiler():
+    if not PROFILER or not _profiler_busy.acquire(blocking=False):
+        return None
+    try:
+        profiler = _new_profiler()
+    except BaseException:
+        _profiler_busy.release()
+        raise
+    if profiler is None:
+        _profiler_busy.release()
+    return profiler
+
+
+def _stop_profiler(profiler, run_name):
+    """Stop profiler and write it under PROFILE_DIR; returns the file path (None if not profiling)"""
+    global _profile_seq
+    if profiler is None:
+        return None
+    try:
+        if PROFILER == "cprofile":
+            profiler.disable()
+        else:
+            profiler.stop()
+    finally:
+        _profiler_busy.release()
+    with _profile_lock:
+        _profile_seq += 1
+        seq = _profile_seq
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = os.path.join(PROFILE_DIR, f"{run_name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{seq}")
+    if PROFILER == "cprofile":
+        path = stem + ".prof"  # Inspect with python -m pstats or snakeviz
+        profiler.dump_stats(path)
+    else:
+        path = stem + ".html"
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+    return path
+
+
+# --- Metrics Endpoint ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # Scrapes would otherwise flood stderr
+
+
+def start_metrics_server(port=METRICS_PORT, host="0.0.0.0"):
+    """Serve GET /metrics from a daemon thread (for processes without their own HTTP API, e.g. Streamlit)"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="wanderwise-metrics", daemon=True).start()
+    return server
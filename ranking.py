@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+# --- V12.0: Top-k Ranking ---
+# The grids only ever show the first few dozen rows, so instead of sorting every result we partition
+# on the primary key, keep everything tied with the k-th value, and order just that handful.
+# Ties always fall back to the current row order, so the ranking is stable and deterministic.
+
+
+def _sort_key(values, ascending):
+    """Float key where smaller sorts first; NaN always last, like pandas sort_values"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        key = values.cat.codes.to_numpy(dtype=np.float64)
+        key[key < 0] = np.nan
+    elif pd.api.types.is_numeric_dtype(values):
+        key = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        codes, _ = pd.factorize(values, sort=True)
+        key = codes.astype(np.float64)
+        key[codes < 0] = np.nan
+    if not ascending:
+        key = -key
+    return np.where(np.isnan(key), np.inf, key)
+
+
+def top_k(frame, keys, k):
+    """Row positions of the first k rows of frame sorted by keys [(column, ascending), ...]"""
+    n = len(frame)
+    k = min(k, n)
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+    sort_keys = [_sort_key(frame[col], ascending) for col, ascending in keys]
+
+    primary = sort_keys[0]
+    if k < n:
+        kth = np.partition(primary, k - 1)[k - 1]
+        candidates = np.flatnonzero(primary <= kth)
+    else:
+        candidates = np.arange(n)
+    # np.lexsort sorts by its last key first: primary key, then the rest, then row position
+    order = np.lexsort([candidates] + [key[candidates] for key in reversed(sort_keys)])
+    return candidates[order[:k]]
+
+
+def top_k_rows(frame, keys, k):
+    """The first k rows of frame sorted by keys, without sorting the rest"""
+    return frame.iloc[top_k(frame, keys, k)]
+
+
+# --- Sort Options ---
+# Shared by the app's sort dropdowns and the API's sort parameter: option -> keys for top_k_rows
+
+SORT_LABELS = {
+    "value": "Best Value ⭐",
+    "popularity": "Popularity (High to Low)",
+    "popularity_asc": "Popularity (Low to High)",
+    "price": "Price (Low to High)",
+    "price_desc": "Price (High to Low)",
+    "name": "Name (A-Z)",
+}
+COUNTRY_SORT_KEYS = {
+    "value": [('Calculated_Value_Score', False)],
+    "popularity": [('Popularity_Score', False), ('Min_Price', True)],
+    "popularity_asc": [('Popularity_Score', True), ('Min_Price', True)],
+    "price": [('Min_Price', True)],
+    "price_desc": [('Min_Price', False)],
+    "name": [('Full_Country', True)],
+}
+CITY_SORT_KEYS = {
+    "value": [('Calculated_Value_Score', False)],
+    "popularity": [('Popularity_Score', False), ('Trip_Cost', True)],
+    "popularity_asc": [('Popularity_Score', True), ('Trip_Cost', True)],
+    "price": [('Trip_Cost', True)],
+    "price_desc": [('Trip_Cost', False)],
+    "name": [('Destination', True)],
+}
+
@@ -0,0 +1,157 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+
+from trip_engine import COST_COLUMNS, MODE_FIND, MODE_MAXIMIZE, TripSearch, attach_columns, search_trips
+
+# --- V12.0: Quantized Search Result Cache ---
+# The sidebar is a small discrete space (budget in $100 steps, 3-30 days, 1-10 travelers, three tiers
+# each), so many sessions ask exactly the same question. Results are kept as destination row
+# positions plus their cost columns, and rebuilt into a result frame on a hit without any costing,
+# pruning or filtering. Find Destinations is cached at the top of the budget's $100 bucket; a hit
+# trims to the exact budget, which is exact because trip costs don't depend on the budget.
+
+BUDGET_BUCKET = 100        # The sidebar's budget step
+RESULT_CACHE_SIZE = 1024   # Entries
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_TTL = 3600.0  # Seconds; the cost model is static, this only bounds staleness of the LRU
+
+
+class CachedSearch(NamedTuple):
+    """Compact TripSearch: row positions and cost columns instead of a DataFrame"""
+    positions: np.ndarray   # int32 destination row positions, in result order
+    costs: tuple            # One float64 array per COST_COLUMNS entry, aligned with positions
+    trip_cost: np.ndarray
+    origin_iata: str
+    target_found: bool
+    max_days: int
+    total_cost: float       # TripSearch.trip_cost (Price a Trip)
+
+    @property
+    def nbytes(self):
+        return self.positions.nbytes + self.trip_cost.nbytes + sum(col.nbytes for col in self.costs)
+
+
+def budget_bucket(total_budget):
+    """Smallest multiple of BUDGET_BUCKET that is >= total_budget"""
+    return math.ceil(total_budget / BUDGET_BUCKET) * BUDGET_BUCKET
+
+
+def search_key(mode, origin_city, total_budget, num_travelers, duration, style, target_dest=None,
+               regions=(), activities=()):
+    """Cache key over the inputs that actually change the mode's result"""
+    if mode == MODE_FIND:
+        budget, target_dest = budget_bucket(total_budget), None
+    elif mode == MODE_MAXIMIZE:
+        budget, duration = total_budget, None  # Stay length is the answer, not an input
+    else:
+        budget = None  # Price a Trip ignores the budget
+    return (mode, origin_city, budget, duration, num_travelers, tuple(style), target_dest,
+            tuple(sorted(regions)), tuple(sorted(activities)))
+
+
+class ResultCache:
+    """Thread-safe LRU of CachedSearch entries, bounded by entry count, bytes and age.
+
+    Entries belong to one dataset version; looking up a different version drops them all.
+    """
+
+    def __init__(self, maxsize=RESULT_CACHE_SIZE, max_bytes=RESULT_CACHE_BYTES, ttl=RESULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()  # key -> (expires_at, CachedSearch)
+        self._lock = threading.Lock()
+
+    def _use_version(self, version):
+        if version != self.version:
+            self._entries.clear()
+            self.nbytes = 0
+            self.version = version
+
+    def get(self, version, key):
+        with self._lock:
+            self._use_version(version)
+            item = self._entries.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    self._pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, version, key, entry):
+        with self._lock:
+            self._use_version(version)
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, entry)
+            self.nbytes += entry.nbytes
+            while self._entries and (len(self._entries) > self.maxsize or self.nbytes > self.max_bytes):
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key):
+        _, entry = self._entries.pop(key)
+        self.nbytes -= entry.nbytes
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'bytes': self.nbytes,
+                    'maxsize': self.maxsize, 'version': self.version}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = self.hits = self.misses = 0
+
+
+def compact_search(destinations, search):
+    """CachedSearch holding the same rows and cost columns as search.result_df"""
+    result_df = search.result_df
+    positions = destinations.index.get_indexer(result_df.index).astype(np.int32)
+    costs = tuple(result_df[col].to_numpy(dtype=np.float64) for col in COST_COLUMNS)
+    trip_cost = result_df['Trip_Cost'].to_numpy(dtype=np.float64)
+    for arr in (positions, trip_cost, *costs):
+        arr.setflags(write=False)  # Shared across sessions, never mutate in place
+    return CachedSearch(positions, costs, trip_cost, search.origin_iata, search.target_found,
+                        search.max_days, search.trip_cost)
+
+
+def expand_search(destinations, entry, total_budget=None):
+    """TripSearch rebuilt from a CachedSearch, trimmed to total_budget when given"""
+    positions, costs, trip_cost = entry.positions, entry.costs, entry.trip_cost
+    if total_budget is not None:
+        keep = trip_cost <= total_budget
+        positions, trip_cost = positions[keep], trip_cost[keep]
+        costs = tuple(col[keep] for col in costs)
+    result_df = attach_columns(destinations.iloc[positions], {**dict(zip(COST_COLUMNS, costs)), 'Trip_Cost': trip_cost})
+    return TripSearch(result_df, entry.origin_iata, target_found=entry.target_found,
+                      max_days=entry.max_days, trip_cost=entry.total_cost)
+
+
+def cached_search(result_cache, version, destinations, mode, origin_city, total_budget, num_travelers, duration,
+                  style, target_dest=None, regions=(), activities=(), **engine):
+    """search_trips through a ResultCache; engine kwargs (matrices, cache, fares, ...) pass through on a miss"""
+    if result_cache is None or not destinations.index.is_unique:
+        return search_trips(destinations, mode, origin_city, total_budget, num_travelers, duration, style,
+                            target_dest, regions, activities, **engine)
+
+    key = search_key(mode, origin_city, total_budget, num_travelers, duration, style, target_dest, regions, activities)
+    entry = result_cache.get(version, key)
+    if entry is None:
+        query_budget = budget_bucket(total_budget) if mode == MODE_FIND else total_budget
+        search = search_trips(destinations, mode, origin_city, query_budget, num_travelers, duration, style,
+                              target_dest, regions, activities, **engine)
+        entry = compact_search(destinations, search)
+        result_cache.put(version, key, entry)
+    return expand_search(destinations, entry, total_budget if mode == MODE_FIND else None)
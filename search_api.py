@@ -0,0 +1,352 @@
+import asyncio
+import json
+import math
+import os
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from country_index import CountryIndex
+from data_prep import fare_index_for, load_master, master_data_version
+from distance import load_travel_matrices
+from instrumentation import ENABLED as METRICS_ENABLED, REGISTRY, stage, start_run
+from ranking import CITY_SORT_KEYS, COUNTRY_SORT_KEYS, top_k_rows
+from result_cache import ResultCache, cached_search
+from spatial import SpatialIndex
+from trip_engine import (
+    ACCOM_TIERS, ACTIVITY_TIERS, FLIGHT_CLASS_TIERS, MODE_FIND, MODE_MAXIMIZE, MODE_PRICE, MOCK_ACTIVITIES_LIST,
+    TIER_LEVELS, BudgetIndex, OriginCache, PairTables, RowIndex, enrich_data, travel_style_for
+)
+
+# --- V12.0: Headless Search API ---
+# A plain ASGI app serving the three goal modes as JSON, for the mobile client and partner widgets.
+# The dataset and its indexes are loaded once per process and only ever read; each search runs in a
+# worker thread so the event loop keeps accepting requests, and identical queries (after
+# normalization) are answered from an in-process response cache. Below that, result_cache shares
+# the costed result between queries that only differ in country, sort or page size.
+#
+#   uvicorn search_api:app --workers 4
+#   GET /search?origin=New%20York,%20US&budget=3000&duration=7
+#   GET /search?mode=price&origin=New%20York,%20US&destination=London,%20GB&duration=7
+
+RESPONSE_CACHE_SIZE = int(os.environ.get("WANDERWISE_API_CACHE_SIZE", 4096))
+ORIGIN_CACHE_SIZE = 256
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+
+# Same bounds as the sidebar widgets in app.py
+BUDGET_RANGE = (500, 50000)
+TRAVELER_RANGE = (1, 10)
+DURATION_RANGE = (3, 30)
+
+MODES = (MODE_FIND, MODE_MAXIMIZE, MODE_PRICE)
+
+class QueryError(ValueError):
+    """Bad request parameters; reported to the client as a 400"""
+
+
+class SearchData:
+    """Master dataset plus every read-only index a search needs, built once per process"""
+
+    def __init__(self):
+        self.version = master_data_version()
+        self.destinations = enrich_data(load_master(self.version))
+        if self.destinations.empty:
+            raise RuntimeError("Master dataset is empty. Did you run data_prep.py?")
+        self.matrices = load_travel_matrices()
+        self.fares = fare_index_for(self.destinations['IATA'])
+        self.spatial = SpatialIndex.from_frame(self.destinations)
+        self.budget_index = BudgetIndex(self.destinations)
+        self.country_index = CountryIndex(self.destinations)
+        self.pairs = PairTables(self.destinations, self.matrices, self.fares)
+        self.origin_cache = OriginCache(maxsize=ORIGIN_CACHE_SIZE)
+        self.result_cache = ResultCache()
+        self.rows = RowIndex(self.destinations)
+
+
+# --- Query Normalization ---
+
+def _one(params, name, default=None):
+    values = params.get(name)
+    return values[-1].strip() if values else default
+
+
+def _int_param(params, name, default, bounds):
+    raw = _one(params, name)
+    if raw is None:
+        return default
+    try:
+        value = float(raw)
+        if not math.isfinite(value):
+            raise ValueError(raw)
+        value = int(value)
+    except (ValueError, OverflowError):
+        raise QueryError(f"{name} must be a number")
+    if not bounds[0] <= value <= bounds[1]:
+        raise QueryError(f"{name} must be between {bounds[0]} and {bounds[1]}")
+    return value
+
+
+def _tier_param(params, name, tiers):
+    level = _one(params, name, "standard").lower()
+    if level not in TIER_LEVELS:
+        raise QueryError(f"{name} must be one of {', '.join(TIER_LEVELS)}")
+    return list(tiers)[TIER_LEVELS.index(level)]
+
+
+def normalize_query(params, rows):
+    """Validated, canonical search parameters as a hashable tuple of (name, value) pairs.
+
+    Defaults are filled in and multi-valued filters sorted, so every spelling of the same question
+    maps to one response-cache key.
+    """
+    mode = _one(params, "mode", MODE_FIND).lower()
+    if mode not in MODES:
+        raise QueryError(f"mode must be one of {', '.join(MODES)}")
+    origin = _one(params, "origin")
+    if rows.position(origin) is None:
+        raise QueryError("origin must be a known destination name")
+
+    query = {
+        "mode": mode,
+        "origin": origin,
+        "budget": _int_param(params, "budget", 3000, BUDGET_RANGE),
+        "travelers": _int_param(params, "travelers", 1, TRAVELER_RANGE),
+        "duration": _int_param(params, "duration", 7, DURATION_RANGE),
+        "flight_class": _tier_param(params, "flight_class", FLIGHT_CLASS_TIERS),
+        "accommodation": _tier_param(params, "accommodation", ACCOM_TIERS),
+        "spending": _tier_param(params, "spending", ACTIVITY_TIERS),
+    }
+    if mode == MODE_FIND:
+        activities = sorted({a.strip() for a in params.get("activity", []) if a.strip()})
+        unknown = [a for a in activities if a not in MOCK_ACTIVITIES_LIST]
+        if unknown:
+            raise QueryError(f"Unknown activity: {unknown[0]}")
+        sort = _one(params, "sort", "value").lower()
+        if sort not in CITY_SORT_KEYS:
+            raise QueryError(f"sort must be one of {', '.join(CITY_SORT_KEYS)}")
+        query.update(
+            regions=tuple(sorted({r.strip() for r in params.get("region", []) if r.strip()})),
+            activities=tuple(activities),
+            country=_one(params, "country") or None,
+            sort=sort,
+            limit=_int_param(params, "limit", DEFAULT_LIMIT, (1, MAX_LIMIT)),
+        )
+    else:
+        destination = _one(params, "destination")
+        if rows.position(destination) is None:
+            raise QueryError("destination must be a known destination name")
+        if destination == origin:
+            # Results never include the origin itself, so there would be no trip to describe
+            raise QueryError("destination must differ from origin")
+        query["destination"] = destination
+    return tuple(query.items())
+
+
+# --- Search ---
+
+def _number(value, digits=2):
+    """JSON-safe float (NaN/inf become null)"""
+    value = float(value)
+    return round(value, digits) if math.isfinite(value) else None
+
+
+def _text(value):
+    return value if isinstance(value, str) else None
+
+
+def _city_records(rows, num_travelers):
+    columns = ['Destination', 'Full_Country', 'iso_country', 'Region', 'IATA', 'Trip_Cost', 'Total_Flight_Group',
+               'Daily_Hotel_Group', 'Daily_Food_Group', 'Daily_Transport_Group', 'Popularity_Score']
+    return [
+        {
+            "destination": destination,
+            "country": _text(country),
+            "iso_country": _text(iso),
+            "region": _text(region),
+            "iata": _text(iata),
+            "trip_cost": _number(trip_cost),
+            "per_person": _number(trip_cost / num_travelers),
+            "flight": _number(flight),
+            "hotel_per_day": _number(hotel),
+            "daily_spend": _number(food + transport),
+            "popularity": _number(popularity),
+        }
+        for (destination, country, iso, region, iata, trip_cost, flight, hotel, food, transport,
+             popularity) in rows[columns].itertuples(index=False, name=None)
+    ]
+
+
+def run_search(data, query):
+    """Answer one normalized query; pure CPU work over shared read-only data (thread-safe)"""
+    q = dict(query)
+    run = start_run("api", mode=q["mode"], origin=q["origin"])
+    try:
+        response = _search_response(data, q)
+        run.annotate(results=response.get("count", int(response.get("trip") is not None)))
+        return response
+    finally:
+        run.finish()
+
+
+def _search_response(data, q):
+    with stage("search") as timer:
+        search = cached_search(
+            data.result_cache, data.version, data.destinations, q["mode"], q["origin"], q["budget"], q["travelers"], q["duration"],
+            style=travel_style_for(q["flight_class"], q["accommodation"], q["spending"]),
+            target_dest=q.get("destination"), regions=q.get("regions", ()), activities=q.get("activities", ()),
+            matrices=data.matrices, cache=data.origin_cache, fares=data.fares,
+            spatial=data.spatial, budget_index=data.budget_index, pairs=data.pairs, rows=data.rows
+        )
+        timer.rows = len(search.result_df)
+    result_df = search.result_df
+    response = {"mode": q["mode"], "origin": q["origin"], "origin_iata": search.origin_iata,
+                "data_version": data.version}
+
+    if q["mode"] == MODE_MAXIMIZE:
+        response.update(destination=q["destination"], max_days=search.max_days,
+                        trip=(_city_records(result_df, q["travelers"]) or [None])[0])
+        return response
+    if q["mode"] == MODE_PRICE:
+        response.update(destination=q["destination"],
+                        trip_cost=None if search.trip_cost is None else _number(search.trip_cost),
+                        trip=(_city_records(result_df, q["travelers"]) or [None])[0])
+        return response
+
+    result_df = result_df.assign(
+        Calculated_Value_Score=(result_df['Perceived_Value'] * 1000) / result_df['Trip_Cost']
+    )
+    response["count"] = len(result_df)
+    if q["country"] is None:
+        with stage("aggregate", rows=len(result_df)):
+            country_groups = data.country_index.aggregate(result_df)
+        with stage("rank", rows=len(country_groups)):
+            visible = top_k_rows(country_groups, COUNTRY_SORT_KEYS[q["sort"]], q["limit"])
+        response["country_count"] = len(country_groups)
+        response["countries"] = [
+            {"country": country, "iso_country": _text(iso), "min_price": _number(min_price),
+             "city_count": int(city_count), "popularity": _number(popularity)}
+            for country, iso, min_price, city_count, popularity in visible[
+                ['Full_Country', 'iso_country', 'Min_Price', 'City_Count', 'Popularity_Score']
+            ].itertuples(index=False, name=None)
+        ]
+    else:
+        cities = result_df[result_df['Full_Country'] == q["country"]]
+        response["country"] = q["country"]
+        response["city_count"] = len(cities)
+        with stage("rank", rows=len(cities)):
+            visible = top_k_rows(cities, CITY_SORT_KEYS[q["sort"]], q["limit"])
+        response["cities"] = _city_records(visible, q["travelers"])
+    return response
+
+
+# --- ASGI App ---
+
+class SearchAPI:
+    """ASGI callable: GET /search, /health and /metrics, JSON in and out, no framework dependency"""
+
+    def __init__(self, data=None, cache_size=RESPONSE_CACHE_SIZE):
+        self.data = data
+        self.cache_size = cache_size
+        self._cache = OrderedDict()   # (data version, normalized query) -> encoded JSON body
+        self._pending = {}            # Same key -> Future, so a burst of identical misses computes once
+        self._load_lock = None
+
+    async def get_data(self):
+        if self.data is None:
+            if self._load_lock is None:
+                self._load_lock = asyncio.Lock()
+            async with self._load_lock:
+                if self.data is None:
+                    self.data = await asyncio.to_thread(SearchData)
+        return self.data
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            if scope["path"].rstrip("/") == "/metrics" and scope["method"] in ("GET", "HEAD"):
+                # Prometheus text format; populated when WANDERWISE_METRICS is set
+                status, body, cache_state = 200, REGISTRY.render().encode("utf-8"), None
+                content_type = b"text/plain; version=0.0.4"
+            else:
+                status, body, cache_state = await self._handle(scope)
+                content_type = b"application/json"
+                if METRICS_ENABLED:
+                    REGISTRY.inc("wanderwise_api_responses_total", status=status, cache=cache_state or "none")
+            headers = [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]
+            if cache_state:
+                headers.append((b"x-cache", cache_state.encode()))
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            # HEAD gets GET's headers (content-length included) and no body
+            await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.get_data()  # Pay the dataset load before taking traffic
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _handle(self, scope):
+        if scope["method"] not in ("GET", "HEAD"):
+            return 405, _encode({"error": "Method not allowed"}), None
+        path = scope["path"].rstrip("/")
+        if path == "/health":
+            data = await self.get_data()
+            return 200, _encode({"status": "ok", "data_version": data.version,
+                                 "destinations": len(data.destinations)}), None
+        if path != "/search":
+            return 404, _encode({"error": "Not found"}), None
+
+        data = await self.get_data()
+        params = parse_qs(scope.get("query_string", b"").decode("utf-8", "replace"))
+        try:
+            key = (data.version, normalize_query(params, data.rows))
+        except QueryError as e:
+            return 400, _encode({"error": str(e)}), None
+
+        body = self._cache.get(key)
+        if body is not None:
+            self._cache.move_to_end(key)
+            return 200, body, "hit"
+        pending = self._pending.get(key)
+        if pending is not None:
+            try:
+                return 200, await asyncio.shield(pending), "hit"
+            except Exception:
+                return 500, _encode({"error": "Search failed"}), None
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            body = _encode(await asyncio.to_thread(run_search, data, key[1]))
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved; waiters (if any) still see it
+            return 500, _encode({"error": "Search failed"}), None
+        else:
+            future.set_result(body)
+        finally:
+            self._pending.pop(key, None)
+            if not future.done():
+                # This request was cancelled (client went away): release anyone coalesced onto it
+                future.set_exception(RuntimeError("Search cancelled"))
+                future.exception()
+        self._cache[key] = body
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return 200, body, "miss"
+
+
+def _encode(payload):
+    return json.dumps(payload, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+app = SearchAPI()
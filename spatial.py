@@ -0,0 +1,104 @@
+import numpy as np
+
+from distance import EARTH_RADIUS_KM
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Brute force over unit vectors is still fast at a few thousand rows
+    cKDTree = None
+
+TREE_MAX_RESULTS = 2048
+
+# --- V12.0: Spatial Index ---
+# Destinations become points on the unit sphere. Straight-line (chord) distance between unit vectors
+# is monotone in great-circle distance, so a Euclidean KD-tree answers radius and k-NN queries in km
+# exactly once the radius is converted to a chord and the chords back to arcs.
+
+
+def unit_vectors(lats, lons):
+    """(N, 3) unit vectors for latitude/longitude in degrees"""
+    phi = np.radians(np.asarray(lats, dtype=np.float64))
+    lam = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_phi = np.cos(phi)
+    return np.column_stack([cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)])
+
+
+def km_to_chord(km):
+    """Unit-sphere chord length for a great-circle distance (anything past the antipode is 2)"""
+    angle = np.clip(np.asarray(km, dtype=np.float64) / EARTH_RADIUS_KM, 0.0, np.pi)
+    return 2 * np.sin(angle / 2)
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord, dtype=np.float64) / 2, 0.0, 1.0))
+
+
+class SpatialIndex:
+    """Radius / nearest-neighbour queries over destination row positions"""
+
+    def __init__(self, lats, lons):
+        points = unit_vectors(lats, lons)
+        valid = np.isfinite(points).all(axis=1)
+        self.positions = np.flatnonzero(valid)  # Tree slot -> destination row position
+        # Rows without coordinates: within() and nearest() never return them. Callers that need the
+        # baseline's haversine behaviour (NaN distance counted as 0 km, as find_candidates does) must
+        # add these back themselves.
+        self.missing = np.flatnonzero(~valid)
+        self.points = points[valid]
+        self.tree = cKDTree(self.points) if cKDTree is not None else None
+
+    @classmethod
+    def from_frame(cls, destinations):
+        return cls(destinations['latitude_deg'].to_numpy(), destinations['longitude_deg'].to_numpy())
+
+    def _query_point(self, lat, lon):
+        return unit_vectors([lat], [lon])[0]
+
+    def _ball(self, point, radius_km):
+        """Ascending tree slots within radius_km of a unit vector"""
+        # A hair of slack so points exactly on the boundary survive float rounding
+        chord = km_to_chord(radius_km) * (1 + 1e-12)
+        # The tree wins for small balls; big ones come back as Python lists, so scan instead. A cap of
+        # chord c covers c^2 / 4 of the sphere, which sizes the ball without a second tree query.
+        if self.tree is not None and len(self.points) * chord ** 2 / 4 <= TREE_MAX_RESULTS:
+            return np.asarray(self.tree.query_ball_point(point, chord, return_sorted=True), dtype=np.intp)
+        # |a - b|^2 = 2 - 2 a.b for unit vectors, so one mat-vec covers every point
+        return np.flatnonzero(self.points @ point >= 1 - chord ** 2 / 2)
+
+    def within(self, lat, lon, radius_km, return_distance=False):
+        """Row positions within radius_km of (lat, lon), in ascending row order (plus their km)"""
+        point = self._query_point(lat, lon)
+        if not np.isfinite(point).all():
+            empty = np.array([], dtype=np.intp)
+            return (empty, np.array([])) if return_distance else empty
+        slots = self._ball(point, radius_km)  # Ascending, and positions is ascending too
+        if not return_distance:
+            return self.positions[slots]
+        chords = np.sqrt(((self.points[slots] - point) ** 2).sum(axis=1))
+        return self.positions[slots], chord_to_km(chords)
+
+    def count_within(self, lat, lon, radius_km):
+        """How many destinations within() would return, without materializing them"""
+        point = self._query_point(lat, lon)
+        if not np.isfinite(point).all():
+            return 0
+        chord = km_to_chord(radius_km) * (1 + 1e-12)
+        if self.tree is not None:
+            return int(self.tree.query_ball_point(point, chord, return_length=True))
+        return int(np.count_nonzero(self.points @ point >= 1 - chord ** 2 / 2))
+
+    def nearest(self, lat, lon, k=5):
+        """(row positions, distances in km) of the k closest destinations, closest first"""
+        point = self._query_point(lat, lon)
+        k = min(k, len(self.points))
+        if k == 0 or not np.isfinite(point).all():
+            return np.array([], dtype=np.intp), np.array([])
+        if self.tree is not None:
+            chords, slots = self.tree.query(point, k=k)
+            chords, slots = np.atleast_1d(chords), np.atleast_1d(slots)
+        else:
+            chords = np.sqrt(((self.points - point) ** 2).sum(axis=1))
+            slots = np.argpartition(chords, k - 1)[:k]
+            slots = slots[np.lexsort((slots, chords[slots]))]
+            chords = chords[slots]
+        return self.positions[slots], chord_to_km(chords)
@@ -0,0 +1,192 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_prep import (
+    COL_CITY_FILE, COUNTRY_POPULARITY, GLOBAL_GATEWAYS, MASTER_CSV_FILE, TIER_1_ANCHORS, TIER_2_ANCHORS,
+    calculate_popularity, fix_iata_codes, score_hub_legacy, seasonality, split_city_col
+)
+
+# V12.0: The column-wise scoring in data_prep must reproduce the V9.0 row-wise apply() passes it
+# replaced. The reference functions below are those passes, kept verbatim.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- Row-wise Reference (pre-V12.0 data_prep) ---
+
+def calculate_popularity_rowwise(row):
+    score = 0
+    country_score = COUNTRY_POPULARITY.get(row['Full_Country'], 10)
+    score += country_score * 0.3 # Base (Max 30)
+
+    city_name = str(row['Clean_City'])
+    if city_name in TIER_1_ANCHORS: score += 40
+    elif city_name in TIER_2_ANCHORS: score += 20
+
+    # Density Bonus: 5 pts per unique scheduled airport (Max 15)
+    density = min(row['Airport_Density'], 3)
+    score += density * 5
+
+    # Global Gateway Bonus
+    if str(row['iata_code']) in GLOBAL_GATEWAYS: score += 15
+
+    # Hub Score Bonus (Native quality metric)
+    def score_hub_lite(r):
+        s = 0
+        if r['type'] == 'large_airport': s += 5
+        if 'International' in str(r['name']): s += 2
+        return s
+    score += score_hub_lite(row)
+
+    return min(max(score, 10), 100) # Norm to 10-100 range
+
+
+def score_hub_legacy_rowwise(row):
+    score = 0
+    if row['type'] == 'large_airport': score += 100
+    elif row['type'] == 'medium_airport': score += 50
+    if 'international' in str(row['name']).lower(): score += 30
+    if any(hub in str(row['iata_code']) for hub in ['CDG', 'LHR', 'HND', 'JFK']): score += 500
+    return score
+
+
+def fix_iata_rowwise(row):
+    iata = str(row['iata_code']).strip().upper()
+    city = str(row['municipality']).lower()
+    if 'paris' in city and row['iso_country'] == 'FR' and iata == 'LGB': return 'CDG'
+    return iata
+
+
+def parse_city_col_rowwise(row):
+    parts = [p.strip() for p in row['City'].split(',')]
+    return parts[0], parts[-1]
+
+
+def get_seasonality_rowwise(row):
+    region = row['Region']
+    if region == 'Europe': return "Summer Peak (Jun-Aug)"
+    if region == 'Asia': return "Varies (Nov-Mar ideal)"
+    if region == 'Oceania': return "Winter Peak (Dec-Feb)"
+    return "Year-round"
+
+
+# --- Fixtures ---
+
+AIRPORT_TYPES = ['large_airport', 'medium_airport', 'small_airport']
+
+EDGE_ROWS = [
+    # Missing city, airport name, IATA code and density
+    {'Full_Country': 'France', 'Clean_City': np.nan, 'Airport_Density': np.nan, 'iata_code': np.nan,
+     'type': 'large_airport', 'name': np.nan, 'Region': np.nan},
+    # Unknown country, density above the cap, IATA containing a legacy hub code
+    {'Full_Country': 'Atlantis', 'Clean_City': 'Paris', 'Airport_Density': 7, 'iata_code': 'XJFKX',
+     'type': 'medium_airport', 'name': 'international terminal', 'Region': 'Other'},
+    # Everything at once: tier-1 anchor, gateway, large international airport (clipped to 100)
+    {'Full_Country': 'United Kingdom', 'Clean_City': 'London', 'Airport_Density': 3, 'iata_code': 'LHR',
+     'type': 'large_airport', 'name': 'London Heathrow International Airport', 'Region': 'Europe'},
+    # Nothing at all (clipped up to 10); 'INTERNATIONAL' only counts for the legacy score
+    {'Full_Country': np.nan, 'Clean_City': '', 'Airport_Density': 0, 'iata_code': '',
+     'type': 'heliport', 'name': 'INTERNATIONAL', 'Region': 'Oceania'},
+]
+
+
+IATA_EDGE_ROWS = [
+    {'municipality': 'Paris', 'iso_country': 'FR', 'iata_code': 'LGB'},             # The override
+    {'municipality': 'PARIS (Le Bourget)', 'iso_country': 'FR', 'iata_code': ' lgb '},
+    {'municipality': 'Paris', 'iso_country': 'US', 'iata_code': 'LGB'},             # Paris, Texas
+    {'municipality': 'Long Beach', 'iso_country': 'US', 'iata_code': 'lgb'},        # Non-Paris LGB
+    {'municipality': np.nan, 'iso_country': 'FR', 'iata_code': 'LGB'},              # No city
+    {'municipality': 'Paris', 'iso_country': np.nan, 'iata_code': 'CDG '},
+]
+
+CITY_EDGE_ROWS = ['Singapore', '  Austin ,  TX , United States ', 'Trailing,', ',Leading', 'A,,B']
+
+
+@pytest.fixture(scope="module")
+def airports():
+    """Scoring inputs for every shipped destination, plus hand-picked edge rows.
+
+    The raw OurAirports table isn't shipped, so city, country, IATA and region come from the master
+    dataset and airport type, name and density are cycled deterministically across rows.
+    """
+    master = pd.read_csv(os.path.join(ROOT, MASTER_CSV_FILE))
+    n = len(master)
+    rows = pd.DataFrame({
+        'Full_Country': master['Full_Country'],
+        'Clean_City': master['Destination'].str.rsplit(',', n=1).str[0],
+        'Airport_Density': np.arange(n) % 5 + 1,
+        'iata_code': master['IATA'],
+        'type': [AIRPORT_TYPES[i % 3] for i in range(n)],
+        'name': master['Destination'].where(np.arange(n) % 2 == 0, master['Destination'] + ' International Airport'),
+        'Region': master['Region'],
+    })
+    return pd.concat([rows, pd.DataFrame(EDGE_ROWS)], ignore_index=True)
+
+
+@pytest.fixture(scope="module")
+def iata_rows():
+    """Master airports as build_airports sees them (codes present), plus Paris/LGB edge rows"""
+    master = pd.read_csv(os.path.join(ROOT, MASTER_CSV_FILE)).dropna(subset=['IATA'])
+    rows = pd.DataFrame({
+        'municipality': master['Destination'].str.rsplit(',', n=1).str[0],
+        'iso_country': master['iso_country'],
+        'iata_code': master['IATA'].where(np.arange(len(master)) % 3 > 0, ' ' + master['IATA'].str.lower()),
+    })
+    return pd.concat([rows, pd.DataFrame(IATA_EDGE_ROWS)], ignore_index=True)
+
+
+# --- Tests ---
+
+def test_popularity_matches_rowwise(airports):
+    expected = airports.apply(calculate_popularity_rowwise, axis=1).astype('float64')
+    actual = calculate_popularity(airports).astype('float64')
+    pd.testing.assert_series_equal(actual, expected, check_names=False, check_exact=True)
+    assert actual.isna().any()  # The missing-density edge row stays NaN in both
+
+
+def test_legacy_hub_score_matches_rowwise(airports):
+    expected = airports.apply(score_hub_legacy_rowwise, axis=1)
+    actual = score_hub_legacy(airports)
+    np.testing.assert_array_equal(actual.to_numpy(), expected.to_numpy())
+    assert actual.index.equals(airports.index)
+
+
+def test_seasonality_matches_rowwise(airports):
+    expected = airports.apply(get_seasonality_rowwise, axis=1)
+    assert seasonality(airports['Region']).tolist() == expected.tolist()
+
+
+def test_fix_iata_matches_rowwise(iata_rows):
+    expected = iata_rows.apply(fix_iata_rowwise, axis=1)
+    actual = fix_iata_codes(iata_rows)
+    assert actual.tolist() == expected.tolist()
+    assert actual.iloc[-len(IATA_EDGE_ROWS):].tolist() == ['CDG', 'CDG', 'LGB', 'LGB', 'LGB', 'CDG']
+
+
+def test_split_city_col_matches_rowwise():
+    shipped = pd.read_csv(os.path.join(ROOT, COL_CITY_FILE))['City']
+    cities = pd.DataFrame({'City': pd.concat([shipped, pd.Series(CITY_EDGE_ROWS)], ignore_index=True)})
+    present = cities['City'].notna()
+    expected = cities[present].apply(parse_city_col_rowwise, axis=1).tolist()
+    match_city, match_country = split_city_col(cities['City'])
+    assert list(zip(match_city[present], match_country[present])) == expected
+    assert expected[-len(CITY_EDGE_ROWS):] == [
+        ('Singapore', 'Singapore'), ('Austin', 'United States'), ('Trailing', ''), ('', 'Leading'), ('A', 'B'),
+    ]
+
+
+def test_split_city_col_missing_city():
+    # The row-wise pass raised on a missing City; the column-wise one leaves it unmatched instead
+    match_city, match_country = split_city_col(pd.Series(['Lisbon, Portugal', np.nan]))
+    assert match_city.iloc[0] == 'Lisbon' and match_country.iloc[0] == 'Portugal'
+    assert pd.isna(match_city.iloc[1]) and pd.isna(match_country.iloc[1])
+
+
+def test_edge_rows_cover_every_branch(airports):
+    legacy = score_hub_legacy(airports).iloc[-len(EDGE_ROWS):].tolist()
+    assert legacy == [100, 580, 630, 30]
+    popularity = calculate_popularity(airports).iloc[-len(EDGE_ROWS):].tolist()
+    assert np.isnan(popularity[0]) and popularity[2] == 100 and popularity[3] == 10
@@ -0,0 +1,673 @@
+import math
+import re
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from distance import FLIGHT_BASE_FARE, FLIGHT_COST_PER_KM, apply_fares, distances_from, flight_base_cost
+from instrumentation import stage
+
+# --- V12.0: Pure Trip-Costing Engine (no Streamlit) ---
+# app.py is a thin UI over these functions; batch jobs and APIs can call them directly.
+
+MODE_FIND = "find"
+MODE_MAXIMIZE = "maximize"
+MODE_PRICE = "price"
+
+DEFAULT_ORIGIN_IATA = "AUS"  # Used if the origin lookup fails
+
+MOCK_ACTIVITIES_LIST = ['Beach', 'Hiking', 'Caves', 'Skiing', 'History', 'Nightlife', 'Foodie', 'Nature', 'Adventure']
+
+# V11.0: Country Desirability Scores (1-10) for Best Value Calculation
+COUNTRY_DESIRABILITY = {
+    # High Demand / Iconic
+    "France": 10, "Italy": 10, "Japan": 10, "Spain": 9, "Greece": 9,
+    "United States": 8, "United Kingdom": 8, "Thailand": 9, "Indonesia": 9,
+    "Portugal": 9, "Vietnam": 8, "Mexico": 8, "Australia": 8, "Canada": 8,
+
+    # Rising Popularity
+    "Turkey": 7, "Croatia": 8, "Iceland": 8, "Switzerland": 8,
+    "Morocco": 7, "Egypt": 7, "Peru": 7, "Brazil": 7, "South Africa": 7,
+    "Argentina": 7, "Colombia": 7, "Costa Rica": 7, "Philippines": 7,
+
+    # Standard Tourist
+    "Germany": 7, "Netherlands": 7, "Sweden": 6, "Norway": 6, "Finland": 6,
+    "Denmark": 6, "Austria": 6, "Belgium": 6, "Ireland": 6, "Czech Republic": 6,
+    "Hungary": 6, "Poland": 6, "India": 6, "China": 6, "South Korea": 7,
+    "Malaysia": 7, "Singapore": 7, "Maldives": 8, "New Zealand": 8,
+
+    # Default fallback will be 5
+}
+
+
+ACCOM_TIERS = {
+    "Bare Essential (1 Star/Camping)": 0.5,
+    "Economy (2-4 Star Hotel)": 1.0,
+    "Luxury (5 Star Only)": 4.0
+}
+
+ACTIVITY_TIERS = {
+    "Budget (Street Food / Free Activities)": 0.5,
+    "Standard (Restaurants / Museums)": 1.0,
+    "Extra Spend (Fine Dining / Guided Tours)": 2.0
+}
+
+FLIGHT_CLASS_TIERS = {
+    "Bare Essential (Spirit/Ryanair / Basic Economy)": 1.0,
+    "Standard (Main Cabin / Checked Bag)": 1.5,
+    "Luxury (First Class / Business)": 3.5
+}
+
+# Tier levels in menu order, for callers that don't use the sidebar labels (e.g. search_api)
+TIER_LEVELS = ("basic", "standard", "luxury")
+
+
+class TravelStyle(NamedTuple):
+    """Tier multipliers chosen in the sidebar (see the *_TIERS maps above)"""
+    flight_mult: float = 1.5
+    accom_mult: float = 1.0
+    act_mult: float = 1.0
+    luxury_stay: bool = False  # Luxury accommodation prices off Daily_Cost_Luxury
+
+
+def travel_style_for(flight_class_name, accom_tier_name, act_tier_name):
+    """TravelStyle for one label from each of FLIGHT_CLASS_TIERS, ACCOM_TIERS and ACTIVITY_TIERS"""
+    return TravelStyle(
+        flight_mult=FLIGHT_CLASS_TIERS[flight_class_name], accom_mult=ACCOM_TIERS[accom_tier_name],
+        act_mult=ACTIVITY_TIERS[act_tier_name], luxury_stay="Luxury" in accom_tier_name
+    )
+
+
+class TripCosts(NamedTuple):
+    """Per-destination cost vectors for one origin + style, aligned with the destinations rows"""
+    distance_km: np.ndarray
+    flight_base: np.ndarray
+    hotel: np.ndarray
+    food: np.ndarray
+    transport: np.ndarray
+    total_daily: np.ndarray
+    total_flight: np.ndarray
+
+
+# Result frame column -> TripCosts field
+COST_COLUMNS = {
+    'Distance_KM': 'distance_km',
+    'Calculated_Flight_Base': 'flight_base',
+    'Daily_Hotel_Group': 'hotel',
+    'Daily_Food_Group': 'food',
+    'Daily_Transport_Group': 'transport',
+    'Total_Daily_Group': 'total_daily',
+    'Total_Flight_Group': 'total_flight',
+}
+
+
+class TripSearch(NamedTuple):
+    """Output of search_trips: result rows plus the single-destination summary values"""
+    result_df: pd.DataFrame
+    origin_iata: str
+    target_found: bool = True
+    max_days: int = None
+    trip_cost: float = None
+
+
+class OriginCache:
+    """V12.0: Bounded LRU of per-origin (Distance_KM, Calculated_Flight_Base) vectors.
+
+    Keyed by origin IATA. One instance is meant to be shared by every session in the process
+    (the app holds it in st.cache_resource), so it must be paired with a single destinations frame.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        # Compute outside the lock; a concurrent miss on the same key just does the work twice
+        value = tuple(compute())
+        for arr in value:
+            arr.setflags(write=False)  # Shared across sessions, never mutate in place
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def peek(self, key):
+        """Cached value for key, or None; never computes (single-pair lookups use this)"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+# Daily local transport by destination type, first matching tier wins (substring match on the name)
+TRANSPORT_TIERS = [
+    # Mega cities: great metro systems
+    (10.0, ['london', 'tokyo', 'new york', 'paris', 'berlin', 'singapore',
+            'hong kong', 'barcelona', 'amsterdam', 'seoul', 'taipei', 'chicago',
+            'boston', 'washington', 'san francisco', 'toronto', 'montreal']),
+    # Sprawl cities: rideshare / car rental
+    (50.0, ['los angeles', 'houston', 'miami', 'dubai', 'atlanta',
+            'dallas', 'phoenix', 'san diego', 'las vegas', 'orlando']),
+    # Nature / rural: car required
+    (80.0, ['reykjavik', 'iceland', 'yellowstone', 'banff', 'queenstown',
+            'patagonia', 'safari', 'fjord', 'highlands', 'anchorage']),
+]
+DEFAULT_TRANSPORT_COST = 30.0
+_TRANSPORT_PATTERNS = [re.compile("|".join(map(re.escape, names))) for _, names in TRANSPORT_TIERS]
+
+# V12.0: Activities as a bit per MOCK_ACTIVITIES_LIST entry (9 activities fit in a uint16)
+ACTIVITY_BITS = {act: 1 << i for i, act in enumerate(MOCK_ACTIVITIES_LIST)}
+ACTIVITY_COUNTS = (2, 3, 4)  # Each destination gets 2-4 activities
+_MASKS_BY_COUNT = [
+    np.array([m for m in range(1 << len(MOCK_ACTIVITIES_LIST)) if bin(m).count("1") == k], dtype=np.uint16)
+    for k in ACTIVITY_COUNTS
+]
+
+def transport_costs(names):
+    """Daily transport cost per destination name: one compiled-regex pass per tier, then np.select"""
+    names = names.astype(object).fillna("Unknown").astype(str).str.lower()
+    tiers = [names.str.contains(pattern).to_numpy(dtype=bool) for pattern in _TRANSPORT_PATTERNS]
+    return np.select(tiers, [cost for cost, _ in TRANSPORT_TIERS], default=DEFAULT_TRANSPORT_COST)
+
+def activity_masks(names):
+    """Deterministic 2-4 activity bitmask per destination name.
+
+    Uses pandas' fixed-key hash rather than the builtin hash(), which is salted per process and made
+    activities differ between workers and restarts.
+    """
+    hashes = pd.util.hash_pandas_object(names.astype(object).fillna("Unknown").astype(str), index=False).to_numpy()
+    count_idx = (hashes % len(ACTIVITY_COUNTS)).astype(np.intp)
+    picks = hashes // len(ACTIVITY_COUNTS)
+    masks = np.zeros(len(hashes), dtype=np.uint16)
+    for i, table in enumerate(_MASKS_BY_COUNT):
+        rows = count_idx == i
+        masks[rows] = table[(picks[rows] % len(table)).astype(np.intp)]
+    return masks
+
+def mask_to_activities(mask):
+    """Decode an activity bitmask back into activity names (MOCK_ACTIVITIES_LIST order)"""
+    return [act for act, bit in ACTIVITY_BITS.items() if int(mask) & bit]
+
+def activities_to_mask(activities):
+    """Combined bitmask for a list of activity names (unknown names are ignored)"""
+    mask = 0
+    for act in activities:
+        mask |= ACTIVITY_BITS.get(act, 0)
+    return mask
+
+def enrich_data(df):
+    """Add lightweight mock enrichment (activities, transport). Returns a new frame.
+
+    V12.0: Fully vectorized; runs once per process (see app.load_real_data).
+    """
+    with stage("enrich_data", rows=len(df)):
+        df = df.copy()
+        df['Activity_Mask'] = activity_masks(df['Destination'])  # Decode for display with mask_to_activities
+        df['Transport_Cost_Daily'] = transport_costs(df['Destination'])
+
+        # V11.0: Calculate Best Value Score
+        # Formula: (Perceived Value Score * 1000) / Total Daily Cost (Proxy for Trip Cost)
+        # We use Total_Daily_Group as a proxy before duration is set, re-calc later with flight
+        if 'Full_Country' in df.columns:
+            df['Perceived_Value'] = df['Full_Country'].astype(object).map(COUNTRY_DESIRABILITY).fillna(5).astype('int64') # Default 5
+        else:
+            df['Perceived_Value'] = 5
+
+    return df
+
+def lookup_origin(destinations, origin_city, rows=None):
+    """(lat, lon, IATA, found) for the origin city, defaulting to AUS at (0, 0) if it is unknown"""
+    pos = target_position(destinations, origin_city, rows)
+    if pos is None:
+        return 0, 0, DEFAULT_ORIGIN_IATA, False
+    return (
+        destinations['latitude_deg'].iat[pos],
+        destinations['longitude_deg'].iat[pos],
+        destinations['IATA'].iat[pos],
+        True,
+    )
+
+def origin_flight_base(destinations, origin_city, matrices=None, cache=None, fares=None, rows=None):
+    """Distance_KM and Calculated_Flight_Base arrays for every destination, plus the origin IATA.
+
+    Uses an O(1) row of the precomputed matrices when available, vectorized haversine otherwise.
+    With a FareIndex, real DOT fares replace the distance model wherever the pair is covered.
+    With an OriginCache, each known origin is only computed once while it stays in the LRU.
+    """
+    o_lat, o_lon, origin_iata, found = lookup_origin(destinations, origin_city, rows)
+
+    def model_costs():
+        if matrices is not None:
+            rows = matrices.origin_rows(origin_iata, matrices.positions(destinations['IATA']))
+            if rows is not None:
+                return rows
+
+        distance_km = distances_from(
+            o_lat, o_lon, destinations['latitude_deg'].to_numpy(), destinations['longitude_deg'].to_numpy()
+        )
+        # Variable flight cost: $150 base + $0.08 per km
+        # Ensures longer flights are more expensive while keeping local flights cheap
+        return distance_km, flight_base_cost(distance_km)
+
+    def compute():
+        with stage("flight_base", rows=len(destinations)):
+            distance_km, flight_base = model_costs()
+            if fares is not None:
+                flight_base = apply_fares(flight_base, fares, origin_iata, fares.positions(destinations['IATA']))
+        return distance_km, flight_base
+
+    # The AUS fallback for unknown origins must not poison the real AUS entry
+    if cache is not None and found:
+        distance_km, flight_base = cache.get_or_compute(origin_iata, compute)
+    else:
+        distance_km, flight_base = compute()
+    return distance_km, flight_base, origin_iata
+
+def daily_group_costs(daily_base, transport_daily, num_travelers, style=TravelStyle()):
+    """(hotel, food, transport) group cost per day. Works on Series or NumPy arrays alike."""
+    # Hotel rooms are shared by two travelers, food and transport are per head
+    hotel = (daily_base * 0.4) * style.accom_mult * math.ceil(num_travelers / 2)
+    food = (daily_base * 0.4) * num_travelers * style.act_mult
+    transport = transport_daily * num_travelers
+    return hotel, food, transport
+
+def flight_group_cost(flight_base, num_travelers, style=TravelStyle()):
+    """Round-trip airfare for the whole group"""
+    return flight_base * style.flight_mult * num_travelers
+
+def trip_cost_arrays(destinations, origin_city, num_travelers, style=TravelStyle(), matrices=None, cache=None,
+                     fares=None, positions=None, pairs=None, rows=None):
+    """Per-destination group cost vectors for one origin and travel style.
+
+    Returns (TripCosts, origin_iata). Nothing is written to destinations, which is shared
+    read-only across sessions; only result rows are ever materialized (see result_frame).
+    With positions, only those rows are costed and the arrays line up with positions.
+    With PairTables as well, the flight costs of just those rows are looked up directly.
+    """
+    if pairs is not None and positions is not None:
+        distance_km, flight_base, origin_iata = pairs.flight_base(destinations, origin_city, positions, cache, rows)
+    else:
+        distance_km, flight_base, origin_iata = origin_flight_base(
+            destinations, origin_city, matrices, cache, fares, rows
+        )
+        if positions is not None:
+            distance_km, flight_base = distance_km[positions], flight_base[positions]
+
+    # Map selected tier to pre-calculated Base Daily Cost
+    daily_col = 'Daily_Cost_Luxury' if style.luxury_stay else 'Daily_Cost_Budget'
+    daily_base = destinations[daily_col].to_numpy(dtype=np.float64)
+    transport_daily = destinations['Transport_Cost_Daily'].to_numpy(dtype=np.float64)
+    if positions is not None:
+        daily_base, transport_daily = daily_base[positions], transport_daily[positions]
+
+    # Apply multipliers
+    hotel, food, transport = daily_group_costs(daily_base, transport_daily, num_travelers, style)
+    costs = TripCosts(
+        distance_km=np.asarray(distance_km, dtype=np.float64),
+        flight_base=np.asarray(flight_base, dtype=np.float64),
+        hotel=hotel,
+        food=food,
+        transport=transport,
+        total_daily=food + hotel + transport,
+        total_flight=flight_group_cost(np.asarray(flight_base, dtype=np.float64), num_travelers, style),
+    )
+    return costs, origin_iata
+
+# --- V12.0: Single-Pair Lookups ---
+# Maximize Days and Price a Trip only ever cost one (origin, destination) pair. The build-time
+# matrices and fare tables from data_prep.py already hold every pair; PairTables maps destination
+# rows onto them once per dataset, so one pair is a couple of cell reads instead of a whole row.
+
+class PairTables:
+    """Destination row -> build-time matrix / fare table positions, resolved once per dataset"""
+
+    def __init__(self, destinations, matrices=None, fares=None):
+        self.matrices = matrices
+        self.fares = fares
+        self.lats = destinations['latitude_deg'].to_numpy(dtype=np.float64)
+        self.lons = destinations['longitude_deg'].to_numpy(dtype=np.float64)
+        self.matrix_positions = None
+        if matrices is not None:
+            matrix_positions = matrices.positions(destinations['IATA'])
+            # Like origin_flight_base, the matrices are only used when they cover every destination
+            if (matrix_positions >= 0).all():
+                self.matrix_positions = matrix_positions
+        self.fare_positions = fares.positions(destinations['IATA']) if fares is not None else None
+
+    def flight_base(self, destinations, origin_city, positions, cache=None, rows=None):
+        """Same (Distance_KM, Calculated_Flight_Base, origin IATA) as origin_flight_base, for positions only"""
+        o_lat, o_lon, origin_iata, found = lookup_origin(destinations, origin_city, rows)
+        positions = np.asarray(positions, dtype=np.intp)
+        if cache is not None and found:
+            cached = cache.peek(origin_iata)
+            if cached is not None:
+                return cached[0][positions], cached[1][positions], origin_iata
+
+        rows = None
+        if self.matrix_positions is not None:
+            rows = self.matrices.origin_rows(origin_iata, self.matrix_positions[positions])
+        if rows is None:
+            distance_km = distances_from(o_lat, o_lon, self.lats[positions], self.lons[positions])
+            rows = distance_km, flight_base_cost(distance_km)
+        distance_km, flight_base = rows
+        if self.fares is not None:
+            flight_base = apply_fares(flight_base, self.fares, origin_iata, self.fare_positions[positions])
+        return distance_km, flight_base, origin_iata
+
+def result_frame(destinations, costs, positions, trip_cost, cost_positions=None):
+    """Destination rows at positions plus their cost columns; O(len(positions)), not O(dataset)
+
+    cost_positions indexes the cost arrays when they only cover a candidate subset.
+    """
+    cost_positions = positions if cost_positions is None else cost_positions
+    columns = {col: getattr(costs, field)[cost_positions] for col, field in COST_COLUMNS.items()}
+    columns['Trip_Cost'] = trip_cost
+    return attach_columns(destinations.iloc[positions], columns)
+
+def attach_columns(rows, columns):
+    """rows plus new columns ({name: array or scalar}); one block concat, ~3x cheaper than assign"""
+    return pd.concat([rows, pd.DataFrame(columns, index=rows.index)], axis=1)
+
+def target_position(destinations, target_dest, rows=None):
+    """Row position of target_dest, or None if it is not in the dataset (O(1) with a RowIndex)"""
+    if rows is not None:
+        return rows.position(target_dest)
+    matches = np.flatnonzero(destinations['Destination'].to_numpy() == target_dest)
+    return int(matches[0]) if len(matches) else None
+
+class RowIndex:
+    """V12.0: Hash lookups from Destination / IATA to row position, built once per dataset.
+
+    Replaces full-column string scans. Duplicate names resolve to their first row, like the scan.
+    """
+
+    def __init__(self, destinations):
+        self.labels = destinations.index
+        self.unique_labels = destinations.index.is_unique
+        self.by_name = self._first_positions(destinations['Destination'])
+        self.by_iata = self._first_positions(destinations['IATA'])
+        # Every row per case-insensitive name, for dropping the origin city from results:
+        # rows of lowercase key k are _lower_rows[_lower_starts[k]:_lower_starts[k + 1]]
+        codes, keys = pd.factorize(destinations['Destination'].astype(str).str.lower().to_numpy(dtype=object))
+        self.by_lower = dict(zip(keys, range(len(keys))))
+        named = np.flatnonzero(codes >= 0)  # Missing names never match
+        self._lower_rows = named[np.argsort(codes[named], kind='stable')]
+        self._lower_starts = np.concatenate([[0], np.cumsum(np.bincount(codes[named], minlength=len(keys)))])
+
+    @staticmethod
+    def _first_positions(values):
+        values = values.to_numpy(dtype=object)
+        positions = np.flatnonzero(pd.notna(values))[::-1]
+        # Built back to front so the first row of a duplicated name is the one that sticks
+        return dict(zip(values[positions].tolist(), positions.tolist()))
+
+    def position(self, name):
+        """Row position of a Destination name, or None"""
+        try:
+            return self.by_name.get(name)
+        except TypeError:  # Unhashable input can't be a destination name
+            return None
+
+    def iata_position(self, iata):
+        """Row position of an IATA code, or None"""
+        try:
+            return self.by_iata.get(iata)
+        except TypeError:
+            return None
+
+    def lower_labels(self, lower_name):
+        """Index labels of every row whose lowercased Destination equals lower_name"""
+        key = self.by_lower.get(lower_name)
+        if key is None:
+            return self.labels[:0]
+        return self.labels[self._lower_rows[self._lower_starts[key]:self._lower_starts[key + 1]]]
+
+# --- V12.0: Candidate Pruning ---
+# Trip_Cost = flight + duration * daily, airfare grows with km on the distance model and no cost is
+# negative. So a destination whose flight floor plus its cheapest possible stay already exceeds the
+# budget can be dropped before it is costed. Real fares don't follow the distance model, so the
+# fare-covered pairs from an origin are bounded by their actual fare instead.
+DISTANCE_BAND_KM = 250
+PRUNE_SLACK_KM = 1.0  # Absorbs float32 rounding in the precomputed matrices
+PRUNE_MAX_FRACTION = 0.5  # Above this share of candidates a plain full scan is cheaper
+
+class BudgetIndex:
+    """Destination rows sorted by each tier's base daily cost, built once per dataset version"""
+
+    def __init__(self, destinations):
+        self.daily_cost, self.order, self.sorted_cost = {}, {}, {}
+        for col in ('Daily_Cost_Budget', 'Daily_Cost_Luxury'):
+            values = destinations[col].to_numpy(dtype=np.float64)
+            order = np.argsort(values, kind='stable')  # NaN sorts last and is never "cheaper than"
+            self.daily_cost[col], self.order[col], self.sorted_cost[col] = values, order, values[order]
+        transport = destinations['Transport_Cost_Daily'].to_numpy(dtype=np.float64)
+        self.min_transport = float(np.nanmin(transport)) if len(transport) else 0.0
+
+    def count_cheaper(self, col, max_daily_base):
+        return int(np.searchsorted(self.sorted_cost[col], max_daily_base, side='right'))
+
+    def cheaper_than(self, col, max_daily_base):
+        """Ascending row positions whose base daily cost is <= max_daily_base (a sorted-index prefix)"""
+        return np.sort(self.order[col][:self.count_cheaper(col, max_daily_base)])
+
+    def max_daily_base(self, remaining_budget, duration, num_travelers, style=TravelStyle()):
+        """Largest base daily cost that still fits remaining_budget over duration days (works on arrays)"""
+        remaining_budget = np.asarray(remaining_budget, dtype=np.float64)
+        if duration <= 0:
+            return np.where(remaining_budget >= 0, np.inf, -np.inf)
+        hotel, food, _ = daily_group_costs(1.0, 0.0, num_travelers, style)
+        _, _, transport_floor = daily_group_costs(0.0, self.min_transport, num_travelers, style)
+        per_base = hotel + food
+        per_day = remaining_budget / duration - transport_floor
+        if per_base <= 0:
+            return np.where(per_day >= 0, np.inf, -np.inf)
+        # Tiny relative slack: the bound must never be tighter than the exact Trip_Cost test
+        limit = per_day / per_base
+        return limit + np.abs(limit) * 1e-9 + 1e-9
+
+def max_affordable_km(total_budget, num_travelers, style=TravelStyle()):
+    """Farthest a destination can be while its distance-model airfare alone still fits the budget"""
+    per_traveler = total_budget / (style.flight_mult * num_travelers)
+    return max((per_traveler - FLIGHT_BASE_FARE) / FLIGHT_COST_PER_KM, 0.0)
+
+def _banded_candidates(positions, km, daily_cost, total_budget, duration, num_travelers, style, budget_index):
+    """Keep rows whose stay fits what is left after the flight floor of their distance band"""
+    if budget_index is None or not len(positions):
+        return positions
+    # Every row in a band flies at least as far as the band's inner edge
+    band = (np.maximum(km - PRUNE_SLACK_KM, 0.0) // DISTANCE_BAND_KM).astype(np.intp)
+    inner_km = np.arange(band.max() + 1) * DISTANCE_BAND_KM
+    flight_floor = flight_group_cost(flight_base_cost(inner_km), num_travelers, style)
+    limits = budget_index.max_daily_base(total_budget - flight_floor, duration, num_travelers, style)
+    return positions[daily_cost[positions] <= limits[band]]
+
+def find_candidates(destinations, origin_city, total_budget, num_travelers, duration, style=TravelStyle(),
+                    spatial=None, fares=None, budget_index=None, rows=None):
+    """V12.0: Ascending row positions that could fit total_budget, or None when nothing can be pruned.
+
+    Distance comes from whichever side touches fewer rows: the spatial index (everything within
+    max_affordable_km) or the budget index (everything cheap enough for the nearest band).
+    Distance bands then drop rows whose stay can't fit after their band's flight floor.
+    """
+    o_lat, o_lon, origin_iata, found = lookup_origin(destinations, origin_city, rows)
+    if not found or not np.isfinite([o_lat, o_lon]).all():
+        return None  # Unknown origins are costed from a fallback, not from these coordinates
+    if spatial is None and budget_index is None:
+        return None
+
+    daily_col = 'Daily_Cost_Luxury' if style.luxury_stay else 'Daily_Cost_Budget'
+    max_km = max_affordable_km(total_budget, num_travelers, style) + PRUNE_SLACK_KM
+    if budget_index is not None:
+        daily_cost = budget_index.daily_cost[daily_col]
+        nearest_floor = flight_group_cost(flight_base_cost(0.0), num_travelers, style)
+        cheap_limit = budget_index.max_daily_base(total_budget - nearest_floor, duration, num_travelers, style)
+        n_cheap = budget_index.count_cheaper(daily_col, cheap_limit)
+    n_near = spatial.count_within(o_lat, o_lon, max_km) if spatial is not None else len(destinations)
+    if budget_index is None:
+        n_cheap = len(destinations)
+    if min(n_near, n_cheap) > len(destinations) * PRUNE_MAX_FRACTION:
+        return None  # Big budget: pruning would cost more than it saves
+
+    parts = []
+    if n_near <= n_cheap:
+        positions, km = spatial.within(o_lat, o_lon, max_km, return_distance=True)
+        if len(spatial.missing):  # No coordinates means a 0 km flight
+            positions = np.concatenate([positions, spatial.missing])
+            km = np.concatenate([km, np.zeros(len(spatial.missing))])
+            order = np.argsort(positions, kind='stable')
+            positions, km = positions[order], km[order]
+    else:
+        positions = budget_index.cheaper_than(daily_col, cheap_limit)
+        km = distances_from(
+            o_lat, o_lon,
+            destinations['latitude_deg'].to_numpy()[positions], destinations['longitude_deg'].to_numpy()[positions]
+        )
+        keep = km <= max_km
+        positions, km = positions[keep], km[keep]
+    if budget_index is not None:
+        positions = _banded_candidates(
+            positions, km, daily_cost, total_budget, duration, num_travelers, style, budget_index
+        )
+    parts.append(positions)
+
+    if fares is not None:
+        origin_fares = fares.origin_fares(origin_iata, fares.positions(destinations['IATA']))
+        if origin_fares is not None:
+            fare_rows = np.flatnonzero(~np.isnan(origin_fares))
+            if budget_index is not None:
+                # The flight is exactly the fare here, so the bound is exact per row
+                fare_flight = flight_group_cost(origin_fares[fare_rows], num_travelers, style)
+                limits = budget_index.max_daily_base(total_budget - fare_flight, duration, num_travelers, style)
+                fare_rows = fare_rows[daily_cost[fare_rows] <= limits]
+            parts.append(fare_rows)
+    parts = [part for part in parts if len(part)]
+    if len(parts) == 1:
+        return parts[0]  # Already ascending and unique
+    return np.unique(np.concatenate(parts)) if parts else np.array([], dtype=np.intp)
+
+def find_destinations(destinations, costs, total_budget, duration, positions=None):
+    """Every destination whose full trip fits the budget (costs cover positions when given)"""
+    trip_cost = costs.total_flight + (costs.total_daily * duration)
+    hits = np.flatnonzero(trip_cost <= total_budget)
+    rows = hits if positions is None else np.asarray(positions)[hits]
+    return result_frame(destinations, costs, rows, trip_cost[hits], cost_positions=hits)
+
+def _target_costs(destinations, target_dest, positions=None):
+    """(row position, index into costs) of target_dest, or (None, None).
+
+    positions is the [row position] the costs were computed for, if only the target was costed.
+    """
+    if positions is None:
+        pos = target_position(destinations, target_dest)
+        return pos, pos
+    return (int(positions[0]), 0) if len(positions) else (None, None)
+
+def maximize_days(destinations, costs, target_dest, total_budget, positions=None):
+    """Longest affordable stay at target_dest. Returns (row_df, max_days); row_df is empty if not found."""
+    pos, k = _target_costs(destinations, target_dest, positions)
+    if pos is None:
+        return destinations.iloc[[]], None
+    flight_cost = costs.total_flight[k]
+    daily_cost = costs.total_daily[k]
+    remaining_budget = total_budget - flight_cost
+    max_days = math.floor(remaining_budget / daily_cost) if remaining_budget > 0 else 0
+    return result_frame(destinations, costs, [pos], flight_cost + (daily_cost * max_days), cost_positions=[k]), max_days
+
+def price_trip(destinations, costs, target_dest, duration, positions=None):
+    """Total cost of a fixed-length trip to target_dest. Returns (row_df, trip_cost)."""
+    pos, k = _target_costs(destinations, target_dest, positions)
+    if pos is None:
+        return destinations.iloc[[]], None
+    trip_cost = costs.total_flight[k] + (costs.total_daily[k] * duration)
+    return result_frame(destinations, costs, [pos], trip_cost, cost_positions=[k]), trip_cost
+
+def apply_filters(result_df, origin_city=None, regions=(), activities=(), rows=None):
+    """Region / activity filters, then drop the origin city itself from the results"""
+    if result_df.empty:
+        return result_df
+    if regions: result_df = result_df[result_df['Region'].isin(regions)]
+    if activities:
+        # Any selected activity matches: one vectorized AND against the combined mask
+        selected_mask = activities_to_mask(activities)
+        result_df = result_df[(result_df['Activity_Mask'].to_numpy() & selected_mask) != 0]
+
+    # Filter out Origin City from Destinations
+    # Ensure case-insensitive comparison
+    if origin_city:
+        origin_clean = str(origin_city).strip().lower()
+        if rows is not None and rows.unique_labels:
+            # Result rows keep their dataset index labels, so the origin's rows are known up front
+            origin_labels = rows.lower_labels(origin_clean)
+            if len(origin_labels):
+                result_df = result_df[~result_df.index.isin(origin_labels)]
+        else:
+            result_df = result_df[~result_df['Destination'].astype(str).str.lower().eq(origin_clean)]
+    return result_df
+
+def search_trips(destinations, mode, origin_city, total_budget, num_travelers, duration,
+                 style=TravelStyle(), target_dest=None, regions=(), activities=(), matrices=None, cache=None,
+                 fares=None, spatial=None, budget_index=None, pairs=None, rows=None):
+    """Run one of the three goal modes end to end and return a TripSearch"""
+    candidates = None
+    with stage("candidates") as timer:
+        if mode == MODE_FIND:
+            candidates = find_candidates(
+                destinations, origin_city, total_budget, num_travelers, duration, style, spatial, fares, budget_index,
+                rows
+            )
+        elif mode in (MODE_MAXIMIZE, MODE_PRICE):
+            # Single-destination modes only ever need the target's costs
+            target = target_position(destinations, target_dest, rows)
+            candidates = np.array([] if target is None else [target], dtype=np.intp)
+        timer.rows = len(destinations) if candidates is None else len(candidates)
+
+    with stage("costing") as timer:
+        costs, origin_iata = trip_cost_arrays(
+            destinations, origin_city, num_travelers, style, matrices, cache, fares, positions=candidates, pairs=pairs,
+            rows=rows
+        )
+        timer.rows = len(costs.total_daily)
+
+    with stage("select") as timer:
+        if mode == MODE_FIND:
+            result_df = find_destinations(destinations, costs, total_budget, duration, positions=candidates)
+            search = TripSearch(result_df, origin_iata)
+        elif mode == MODE_MAXIMIZE:
+            result_df, max_days = maximize_days(destinations, costs, target_dest, total_budget, positions=candidates)
+            search = TripSearch(result_df, origin_iata, target_found=not result_df.empty, max_days=max_days)
+        elif mode == MODE_PRICE:
+            result_df, trip_cost = price_trip(destinations, costs, target_dest, duration, positions=candidates)
+            search = TripSearch(result_df, origin_iata, target_found=not result_df.empty, trip_cost=trip_cost)
+        else:
+            raise ValueError(f"Unknown search mode: {mode}")
+        timer.rows = len(result_df)
+
+    with stage("filters", rows=len(search.result_df)):
+        return search._replace(result_df=apply_filters(search.result_df, origin_city, regions, activities, rows))